@@ -1,12 +1,15 @@
 #!/usr/bin/python3
 
-import csv, logging, os, pathlib, pprint, sys
-import xml.etree.ElementTree as ET
-from xml.dom import minidom
-from yattag import Doc
-
+import argparse, concurrent.futures, contextlib, glob, io, logging, os
+import pathlib, pprint, sys, time
 import ed5decode
 import edl
+import exportcache
+import odbfile
+import profiling
+import timecode
+import timeline
+import xmlwriter
 
 """
 LW_ODB.py -- Classes to help read Lightworks *.odb files.
@@ -31,7 +34,7 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 # Plain text, structure is pretty self evident.
 class LW_ODB:
 
-    def __init__(self, filename):
+    def __init__(self, filename, workers=1, processes=False, lazy=False):
         self.filename = filename
         self.metadata = {}
         """dict of misc values in the odb file"""
@@ -43,13 +46,20 @@ class LW_ODB:
         """list of field names"""
         self.fnum = None
         """map from field name to field index"""
+        self.fps = 30
+        """frames per second (PROJECT_RATE)"""
+        self.odb = None
+        """the odbfile.ODBFile with typed columns of the table"""
         self.items = {}
-        """rows = map from Cookie to dict of fname/value; special '.ed5' is parsed ed5 file"""
+        """rows = map from Cookie to LW_Item (dict of fname/value); special '.ed5' is parsed ed5 file"""
 
         self.loadProject()
         print(self.metadata['PROJECT_NAME'])
         #print(list(self.items.keys()))
-        self.loadItems()
+        if lazy:
+            # each '.ed5' gets loaded on first access
+            return
+        self.loadItems(workers, processes)
 
         any = next (iter (self.items.values()))['.ed5']
         print(any.filename, any.title, any.fps)
@@ -61,104 +71,203 @@ class LW_ODB:
            Lists metadata at the top, then a list of resources (clips and edited sequences) below.
            The "cookie" from each row refers to an .ed5 file with details."""
         proj_file = self.filename
+        directory = os.path.dirname(os.path.abspath(proj_file))
         if not os.access(proj_file, os.F_OK):
             logging.error('can not read project info (%s)' % proj_file)
             self.title = 'unknown'
         else:
-            with open(proj_file) as csvfile:
-                tablerow = 0
-                for row in csv.reader(csvfile, delimiter=',', quotechar='"', skipinitialspace=True):
-                    if len(row) == 1:
-                        [k,s,v] = row[0].partition(':')
-                        if not not v:
-                            self.metadata[k] = v
-                    else:
-                        tablerow += 1
-                        if tablerow == 1:
-                            # field lengths
-                            self.flens = row
-                        elif tablerow == 2:
-                            # field types
-                            self.ftypes = row
-                        elif tablerow == 3:
-                            # field names
-                            self.fnames = row
-                            self.fnum = dict(zip(row, range(0,len(row))))
-                        else:
-                            # all the data rows
-                            #self.items[row[0]] = row
-                            self.items[row[0]] = dict(zip(self.fnames, row))
-
-    def loadItems(self):
-        """Load the items in project, attach as element '.ed5'."""
+            # parsed once per project, shared with ED5.proj_info
+            with profiling.stage('load odb'), ed5decode.gc_paused():
+                db = self.odb = odbfile.load(proj_file)
+                self.metadata = dict(db.metadata)
+                self.flens = db.flens
+                self.ftypes = db.ftypes
+                self.fnames = db.fnames
+                self.fnum = db.fnum
+                # items keep the text of the file, db.column() has it typed
+                for row in db.rows(typed=False):
+                    cookie = row[db.fnames[0]]
+                    self.items[cookie] = LW_Item(
+                        row, os.path.join(directory, '%s.ed5' % cookie))
+            if db.fps:
+                self.fps = db.fps
+
+    def loadItems(self, workers=1, processes=False):
+        """Load the items in project, attach as element '.ed5'.
+           With workers > 1 the ed5 files are decoded concurrently by a
+           thread pool, or by a process pool if processes is true."""
         directory = os.path.dirname(os.path.abspath(self.filename))
-        for cookie in self.items:
+        cookies = list(self.items)
+        seg_files = [os.path.join(directory, '%s.ed5' % cookie)
+                     for cookie in cookies]
+
+        if workers <= 1:
+            for cookie, seg_file in zip(cookies, seg_files):
+                with profiling.for_file(seg_file):
+                    self.items[cookie]['.ed5'] = \
+                        ed5decode.ed5_cache.get(seg_file)
+            return
+
+        # only decode what is not in memory or in the ed5 store yet
+        todo = []
+        for cookie, seg_file in zip(cookies, seg_files):
+            ed5 = ed5decode.ed5_cache.cached(seg_file)
+            if ed5 is None:
+                todo.append((cookie, seg_file))
+            else:
+                self.items[cookie]['.ed5'] = ed5
+        if not todo:
+            return
+        cookies, seg_files = zip(*todo)
+        # scan the directory once here, not in each thread
+        ed5decode.cookie_index(directory).refresh()
+
+        if processes:
+            # workers send back decoded ED5 objects without segment tree
+            pool = concurrent.futures.ProcessPoolExecutor(workers)
+            chunksize = max(1, len(seg_files) // (workers * 4))
+        else:
+            pool = concurrent.futures.ThreadPoolExecutor(workers)
+            chunksize = 1
+        with pool:
+            # map() keeps the order of the odb table
+            ed5s = pool.map(ed5decode.ED5, seg_files, chunksize=chunksize)
+            for cookie, seg_file, ed5 in zip(cookies, seg_files, ed5s):
+                ed5decode.ed5_cache.add(seg_file, ed5)
+                self.items[cookie]['.ed5'] = ed5
+
+    def selectItems(self, cookies=None, cache=None):
+        """Return the items to export, in odb table order.
+           Rows flagged 66 (vanished transients) are skipped.  If cookies
+           is given, only these edits and the shots they use are chosen;
+           this loads the ed5 files of the edits, unless their reels are
+           known from the exportcache.ExportCache cache."""
+        live = [cookie for cookie in self.items
+                if str(self.items[cookie].get('Flags')) != '66']
+        if cookies is None:
+            return [self.items[cookie] for cookie in live]
+
+        wanted = set(cookies)
+        for cookie in cookies:
             item = self.items[cookie]
-            seg_file = os.path.join(directory, '%s.ed5' % cookie)
-            item['.ed5'] = ed5decode.ED5(seg_file)
+            if item['Type'] == 'edit':
+                deps = cache.deps(item) if cache else None
+                if deps is None:
+                    deps = self.itemDeps(item)
+                wanted.update(deps)
+        return [self.items[cookie] for cookie in live if cookie in wanted]
+
+    def itemDeps(self, item):
+        """Return cookies of the project items an edit uses."""
+        if item['Type'] != 'edit':
+            return []
+        return sorted({c.reel for c in item['.ed5'].edit_cells
+                       if c.reel in self.items})
 
     def fixEdits(self, edit_cells):
-        """Fix and clean list of edits."""
+        """Return fixed and cleaned copy of list of edits."""
+
+        # ed5 objects are shared through ed5decode.ed5_cache, don't touch
+        # their cells
+        edit_cells = [c.copy() for c in edit_cells]
         
         # merge pairs of cells
         num =  len(edit_cells)
         if num % 2:
             raise ValueError('odd number of edit cells')
         else:
-            for n in range(num-1, 0, -2):
-                edit_cells[n-1]['src_out'] = edit_cells[n]['src_out']
-                edit_cells[n-1]['rec_out'] = edit_cells[n]['rec_out']
-                del edit_cells[n]
+            edit_cells = ed5decode.pair_cells(edit_cells)
         
         # merge related cuts
-        [ a != b 
-        and a['reel']    == b['reel']    
-        and a['src_in']  == b['src_in']  
-        and a['src_out'] == b['src_out'] 
-        and a['rec_in']  == b['rec_in']  
-        and a['rec_out'] == b['rec_out'] 
-        
-        and not a.update(track=a['track']+' '+b['track'])
-        and not edit_cells.remove(b)
-        
-        for a in edit_cells
-        for b in edit_cells]
+        edit_cells = ed5decode.merge_cuts(edit_cells)
 
         return edit_cells
 
 
-    def makeEDL(self):
-        for cookie in self.items:
-            item = self.items[cookie]
-            if item["Type"] == "edit":
-                itemdata = item['.ed5'].EHP
+    def makeEDL(self, cookies=None, cache=None):
+        """Return the EDL of the (last) edit.
+           With an exportcache.ExportCache in cache, only edits that
+           changed since the last run are decoded again."""
+        e = None
+        for item, e in self.makeEDLs(cookies, cache):
+            pass
+        return e
+
+    def makeEDLs(self, cookies=None, cache=None):
+        """Generate (item, EDL) for each edit, like makeEDL."""
+        for item in self.selectItems(cookies, cache):
+            if item["Type"] != "edit":
+                continue
+            with profiling.for_file(item.filename), profiling.stage('edl'):
                 e = edl.EDL()
                 e.title = self.metadata['PROJECT_NAME']
-
-                edits = item['.ed5'].edit_cells
-                self.fixEdits(edits)
-                num = 1
-                for c in edits:
-                    if c['reel'] == 'BL':
-                        # black frame
-                        pass
-                    else:
+                e.dropframe = timecode.is_dropframe(self.fps)
+                rows = cache.get(item, 'edl', self.items) if cache else None
+                if rows is None:
+                    blocks = self.edlBlocks(item)
+                    if cache:
+                        cache.put(item, 'edl', [vars(b) for b in blocks],
+                                  self.itemDeps(item))
+                else:
+                    blocks = []
+                    for row in rows:
                         b = edl.EDLBlock()
-                        b.id = num
-                        num += 1
-                        b.reel = c['reel']
-                        b.channels = c['track']
-                        b.transition = 'C'
-                        #b.transDur = ?
-                        b.srcIn = c['src_in']
-                        b.srcOut = c['src_out']
-                        b.recIn = c['rec_in']
-                        b.recOut = c['rec_out']
-                        #c['aud'], c['from_clip']
-                        e.append(b)
-        return e
+                        vars(b).update(row)
+                        blocks.append(b)
+                e.extend(blocks)
+            yield item, e
+
+    def edlBlocks(self, item):
+        """Return list of EDLBlock for an edit item.
+           A transition and the clip after it become one block, with the
+           id of the event before."""
+        blocks = []
+        times = []
+        tl = timeline.Timeline(self.fixEdits(item['.ed5'].edit_cells),
+                               self.fps)
+        num = 0
+        for i, t in timeline.resolve_transitions(tl.cells):
+            c = tl.cells[i]
+            if c.reel == 'BL':
+                # black frame
+                continue
+            if t is None:
+                num += 1
+            b = edl.EDLBlock()
+            b.id = num
+            b.reel = c.reel
+            b.channels = c.track
+            if t is None:
+                b.transition = 'C'
+                rec_in = tl.rec_in[i]
+            else:
+                b.transition = timeline.TRANSITIONS[tl.cells[t].reel]
+                b.transDur = '%03d' % tl.src_out[t]
+                rec_in = tl.rec_in[t]
+            #c.aud, c.from_clip
+            blocks.append(b)
+            times += (tl.src_in[i], tl.src_out[i], rec_in, tl.rec_out[i])
+
+        codes = iter(timecode.formatter(self.fps).format_frames(times))
+        for b, tc in zip(blocks, zip(*[codes] * 4)):
+            b.srcIn, b.srcOut, b.recIn, b.recOut = tc
+        return blocks
+
+    def makeMLT(self, item, f):
+        """Write an edit item as MLT XML to the open file f, at the frame
+           rate of this project."""
+        ed5 = item['.ed5']
+        with profiling.for_file(item.filename), \
+             profiling.stage('write mlt'):
+            tl = timeline.Timeline(self.fixEdits(ed5.edit_cells), self.fps)
+            ed5decode.write_mlt(f, ed5.mlt_producers(), tl)
+
+    def makeFcpxml(self, f, cookies=None, cache=None):
+        """Write the project as Final Cut 7 XML to the open file f.
+           Each item is streamed out as soon as it is visited.  With an
+           exportcache.ExportCache in cache, items that did not change
+           since the last run are copied from there without decoding."""
 
-    def makeFcpxml(self):
         # minimal file for Premiere to accept:
         # condensed <element/> not allowed!
         # <?xml version="1.0"?>
@@ -169,186 +278,405 @@ class LW_ODB:
 	#   </project>
 	# </xmeml>
 
-        uid = 1
-
-        root = ET.Element('xmeml', {'version': '4'})
-        project = ET.SubElement(root, 'project')
-        name = ET.SubElement(project, 'name')
-        name.text = self.metadata['PROJECT_NAME']
-        children = ET.SubElement(project, 'children')
-        children.tail = ' '  #prevent condensing
-
-##        project_children_bin = ET.SubElement(children, 'bin')
-##        name = ET.SubElement(project_children_bin, 'name')
-##        name.text = 'Assets'
-##        children = ET.SubElement(project_children_bin, 'children')
-##        children.tail = ' '  #prevent condensing
+        xml = xmlwriter.XMLWriter(f)
+        tag, text = xml.tag, xml.text
+        xml.declaration()
+        xml.start('xmeml', version='4')
+        xml.start('project')
+        with tag('name'):
+            text(self.metadata['PROJECT_NAME'])
+        xml.start('children')
+
+##        xml.start('bin')
+##        with tag('name'):
+##            text('Assets')
+##        xml.start('children')
         
-        for cookie in self.items:
-            item = self.items[cookie]
-
-            if item["Type"] == "edit":
-                # Describes an edited sequence.
-
-                doc, tag, text = Doc().tagtext()
-
-                with tag('sequence', id='sequence-%s' % uid):
-                    uid += 1
-                    with tag('rate'):
-                        with tag('timebase'):
-                            text('30')
-                        with tag('ntsc'):
-                            text('TRUE')
-                    with tag('name'):
-                        text(self.metadata['PROJECT_NAME'])
-                    with tag('media'):
-                        with tag('video'):
-                            with tag('format'):
-                                with tag('samplecharacteristics'):
-                                    with tag('rate'):
-                                        with tag('timebase'):
-                                            text('30')
-                                        with tag('ntsc'):
-                                            text('TRUE')
-                                    with tag('width'):
-                                        text('1920')
-                                    with tag('height'):
-                                        text('1080')
-                                    with tag('anamorphic'):
-                                        text('FALSE')
-                                    with tag('pixelaspectratio'):
-                                        text('square')
-                                    with tag('fielddominance'):
-                                        text('none')
-                                    with tag('colordepth'):
-                                        text('24')
-
-                            with tag('track'):
-                                edits = item['.ed5'].edit_cells
-                                self.fixEdits(edits)
-
-                                for c in edits:
-                                    if c['reel'] == 'BL':
-                                        # black frame
-                                        pass
-                                    else:
-                                        id_clipitem = 'clipitem-%s' % uid
-                                        uid += 1
-                                        with tag('clipitem', id=id_clipitem):
-                                            with tag('start'):
+        for item in self.selectItems(cookies, cache):
+            with profiling.for_file(item.filename), \
+                 profiling.stage('write xmeml'):
+                if cache is None:
+                    self.writeFcpItem(xml, item)
+                    continue
+                fragment = cache.get(item, 'xmeml', self.items)
+                if fragment is None:
+                    # render at the current depth, to be spliced in later
+                    # runs
+                    buf = io.StringIO()
+                    self.writeFcpItem(
+                        xmlwriter.XMLWriter(buf, stack=xml.stack), item)
+                    fragment = buf.getvalue()
+                    cache.put(item, 'xmeml', fragment, self.itemDeps(item))
+                xml.raw(fragment)
+
+        xml.end()   # children
+        xml.end()   # project
+        xml.end()   # xmeml
+
+    def writeFcpItem(self, xml, item):
+        """Write one project item to the XMLWriter xml.
+           All ids are derived from cookies, so the output of an item
+           does not depend on the items written before it."""
+
+        tag, text = xml.tag, xml.text
+        timebase = '%d' % round(self.fps)
+        # PROJECT_RATE is a whole number, 29.97 and 59.94 fps projects
+        # can't be told from 30 and 60; keep the NTSC flag the first
+        # version wrote for them
+        ntsc = 'TRUE' if round(self.fps) % 30 == 0 else 'FALSE'
+
+        if item["Type"] == "edit":
+            # Describes an edited sequence.
+
+            with tag('sequence', id='sequence-%s' % item.cookie):
+                with tag('rate'):
+                    with tag('timebase'):
+                        text(timebase)
+                    with tag('ntsc'):
+                        text(ntsc)
+                with tag('name'):
+                    text(self.metadata['PROJECT_NAME'])
+                with tag('media'):
+                    with tag('video'):
+                        with tag('format'):
+                            with tag('samplecharacteristics'):
+                                with tag('rate'):
+                                    with tag('timebase'):
+                                        text(timebase)
+                                    with tag('ntsc'):
+                                        text(ntsc)
+                                with tag('width'):
+                                    text('1920')
+                                with tag('height'):
+                                    text('1080')
+                                with tag('anamorphic'):
+                                    text('FALSE')
+                                with tag('pixelaspectratio'):
+                                    text('square')
+                                with tag('fielddominance'):
+                                    text('none')
+                                with tag('colordepth'):
+                                    text('24')
+
+                        with tag('track'):
+                            tl = timeline.Timeline(
+                                self.fixEdits(item['.ed5'].edit_cells),
+                                self.fps)
+
+                            num = 1
+                            for i, c in enumerate(tl.cells):
+                                if c.reel == 'BL':
+                                    # black frame
+                                    pass
+                                else:
+                                    id_clipitem = 'clipitem-%s-%d' % (
+                                        item.cookie, num)
+                                    num += 1
+                                    with tag('clipitem', id=id_clipitem):
+                                        with tag('start'):
+                                            text('%d' % tl.rec_in[i])
+                                        with tag('end'):
+                                            text('%d' % tl.rec_out[i])
+                                        with tag('in'):
+                                            text('%d' % tl.src_in[i])
+                                        with tag('out'):
+                                            text('%d' % tl.src_out[i])
+                                        xml.stag('file', id='file-%s' % c.reel)
+                                        with tag('link'):
+                                            with tag('linkclipref'):
+                                                text(id_clipitem)
+                                            with tag('mediatype'):
+                                                text('video')
+                                            with tag('trackindex'):
                                                 text('1')
-                                            with tag('end'):
-                                                text('11')
-                                            with tag('in'):
-                                                text('21')
-                                            with tag('out'):
-                                                text('31')
-                                            doc.stag('file', id='file-%s' % c['reel'])
-                                            with tag('link'):
-                                                with tag('linkclipref'):
-                                                    text(id_clipitem)
-                                                with tag('mediatype'):
-                                                    text('video')
-                                                with tag('trackindex'):
-                                                    text('1')
-                                                with tag('clipindex'):
-                                                    text('1')
-
-##                                            b.reel = c['reel']
-##                                            b.channels = c['track']
+                                            with tag('clipindex'):
+                                                text('1')
+
+##                                            b.reel = c.reel
+##                                            b.channels = c.track
 ##                                            b.transition = 'C'
 ##                                            #b.transDur = ?
-##                                            b.srcIn = c['src_in']
-##                                            b.srcOut = c['src_out']
-##                                            b.recIn = c['rec_in']
-##                                            b.recOut = c['rec_out']
-##                                            #c['aud'], c['from_clip']
-
-                children.append( ET.fromstring(doc.getvalue()) )
-
-            elif item["Type"] == "shot":
-                # Describes a video clip.
-                # Tested by importing into Premiere CS6.
-                # Elements and values below are required; Pre will crash or
-                #  simply fail to see the clip otherwise.
-                # P requires certain elements, even if empty.
-                # P requires 'id' attribute on some elements, but not all.
-                
-                doc, tag, text = Doc().tagtext()
-
-                ed5 = item['.ed5'].EHP
-                keys = ed5.keys()
-                files = set()
-                for k in keys:
-                    if k.startswith("ORIGINAL_FILE_"):
-                        files.add(ed5[k])
-                if len(files) == 0:
-                    logging.error('cookie has zero files: %s' % item["Cookie"])
-                    filepath = ""
-                elif len(files) > 1:
-                    logging.error('cookie has many files: %s => %s' % [item["Cookie"], files])
-                    filepath = next(iter(files))
-                else:
-                    filepath = next(iter(files))
-
-                if len(filepath) > 0:
-                    filepath = pathlib.Path(filepath).as_uri()
-
-                with tag('clip', id=item['Cookie']):
-                    with tag('ismasterclip'):
-                        text('TRUE')
-                    with tag('rate'):
-                        with tag('timebase'):
-                            text('30')
-                        with tag('ntsc'):
-                            text('TRUE')
-                    with tag('name'):
-                        text(item['Cookie'])
-
-                    with tag('media'):
-                        with tag('video'):
-                            with tag('track'):
-                                with tag('clipitem', id='clipitem-%s' % uid):
-                                    uid += 1
-                                    with tag('file', id='file-%s' % item['Cookie']):
-                                        with tag('pathurl'):
-                                            text(filepath)
-                                        with tag('media'):
-                                            with tag('video'):
-                                                text(' ')
-                                            with tag('audio'):
-                                                text(' ')
-
-                children.append( ET.fromstring(doc.getvalue()) )
-
+##                                            b.srcIn = c.src_in
+##                                            b.srcOut = c.src_out
+##                                            b.recIn = c.rec_in
+##                                            b.recOut = c.rec_out
+##                                            #c.aud, c.from_clip
+
+        elif item["Type"] == "shot":
+            # Describes a video clip.
+            # Tested by importing into Premiere CS6.
+            # Elements and values below are required; Pre will crash or
+            #  simply fail to see the clip otherwise.
+            # P requires certain elements, even if empty.
+            # P requires 'id' attribute on some elements, but not all.
+            
+            ed5 = item['.ed5'].EHP
+            keys = ed5.keys()
+            files = set()
+            for k in keys:
+                if k.startswith("ORIGINAL_FILE_"):
+                    files.add(ed5[k])
+            if len(files) == 0:
+                logging.error('cookie has zero files: %s' % item["Cookie"])
+                filepath = ""
+            elif len(files) > 1:
+                logging.error('cookie has many files: %s => %s' % [item["Cookie"], files])
+                filepath = next(iter(files))
             else:
-                logging.error('unknown asset type %s' % item["Type"])
-        
-        return ET.ElementTree(root)
+                filepath = next(iter(files))
+
+            if len(filepath) > 0:
+                filepath = pathlib.Path(filepath).as_uri()
+
+            with tag('clip', id=item['Cookie']):
+                with tag('ismasterclip'):
+                    text('TRUE')
+                with tag('rate'):
+                    with tag('timebase'):
+                        text(timebase)
+                    with tag('ntsc'):
+                        text(ntsc)
+                with tag('name'):
+                    text(item['Cookie'])
+
+                with tag('media'):
+                    with tag('video'):
+                        with tag('track'):
+                            with tag('clipitem', id='clipitem-%s' % item.cookie):
+                                with tag('file', id='file-%s' % item['Cookie']):
+                                    with tag('pathurl'):
+                                        text(filepath)
+                                    with tag('media'):
+                                        with tag('video'):
+                                            text(' ')
+                                        with tag('audio'):
+                                            text(' ')
+
+        else:
+            logging.error('unknown asset type %s' % item["Type"])
 
 
-class LW_Item:
-    """quickie class to hunt for a better way to wrap things together"""
+class LW_Item(dict):
+    """One row of the odb table, map from field name to value.
+       The special key '.ed5' is decoded from filename on first access."""
 
     def __init__(self, data, filename):
+        dict.__init__(self, data)
         self.filename = filename
-
-        self.data = data
-        """dict key->value"""
+        """path of the item's ed5 file"""
         self.cookie = data['Cookie']
         """What LightWorks calls this thing."""
 
-        seg_file = os.path.join(directory, '%s.ed5' % cookie)
-        self.ed5 = ed5decode.ED5(seg_file)
-        """ed5decode.ED5 object, decoded from filename"""
-
+    def __missing__(self, key):
+        if key != '.ed5':
+            raise KeyError(key)
+        ed5 = self['.ed5'] = ed5decode.ed5_cache.get(self.filename)
+        return ed5
+
+
+FORMATS = {'xmeml': 'xml', 'edl': 'edl', 'mlt': 'mlt'}
+"""export formats and the extension of their files"""
+
+try:
+    import resource
+except ImportError:
+    # not on Windows
+    resource = None
+
+
+def project_files(path):
+    """Return the project odb files of path, an odb file or an archive
+       directory (its summary.odb, else its O*.odb files)."""
+    if not os.path.isdir(path):
+        return [path]
+    summary = os.path.join(path, 'summary.odb')
+    if os.path.exists(summary):
+        return [summary]
+    return sorted(glob.glob(os.path.join(glob.escape(path), 'O*.odb')))
+
+def output_path(template, odb_file, ext, edit=''):
+    """Fill {dir}, {name}, {stem} of odb_file, {ext} and {edit} into an
+       output path; edit is '-<cookie>' for files of a single edit."""
+    name = os.path.basename(odb_file)
+    return template.format(dir=os.path.dirname(os.path.abspath(odb_file)),
+                           name=name, stem=os.path.splitext(name)[0],
+                           ext=ext, edit=edit)
+
+def overwrites_edits(template, formats):
+    'True if the EDL or MLT files of the edits would all get one name'
+    if 'edl' not in formats and 'mlt' not in formats:
+        return False
+    return output_path(template, 'x', 'x') == \
+        output_path(template, 'x', 'x', '-x')
+
+@contextlib.contextmanager
+def replacing(filename):
+    """Return the name of a new file to write instead of filename; it
+       replaces filename at the end of the with block, unless that
+       raised or wrote nothing.  Readers of filename never see half a
+       file."""
+    tmp = '%s.%d.tmp' % (filename, os.getpid())
+    try:
+        yield tmp
+        if os.path.exists(tmp):
+            os.replace(tmp, filename)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+def peak_rss():
+    'return the peak resident memory of this process in bytes, or None'
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes, but bytes on macOS
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def export_project(odb_file, formats, template, use_cache=True, cache=None):
+    """Export the project odb_file in each of formats (keys of FORMATS).
+       Returns a list of the files written.
+
+       Final Cut XML is written for the whole project, EDL and MLT once
+       per edit.  With use_cache the project's export cache (template
+       with ext 'cache') keeps the output of unchanged items; a caller
+       exporting again and again can pass the ExportCache in cache."""
+    if not os.access(odb_file, os.R_OK):
+        raise OSError('can not read project %s' % odb_file)
+    written = []
+    odb = LW_ODB(odb_file, lazy=True)
+    if cache is not None:
+        cache.new_run()
+    elif use_cache:
+        cache = exportcache.ExportCache(output_path(template, odb_file,
+                                                    'cache'),
+                                        odb.metadata)
+    if 'xmeml' in formats:
+        path = output_path(template, odb_file, FORMATS['xmeml'])
+        with replacing(path) as tmp, open(tmp, 'w') as f:
+            odb.makeFcpxml(f, cache=cache)
+        written.append(path)
+    if 'edl' in formats:
+        for item, e in odb.makeEDLs(cache=cache):
+            path = output_path(template, odb_file, FORMATS['edl'],
+                               '-' + item.cookie)
+            with replacing(path) as tmp, open(tmp, 'w') as f:
+                e.savePremiere(f)
+            written.append(path)
+    if 'mlt' in formats:
+        for item in odb.selectItems():
+            if item['Type'] != 'edit' or not item['.ed5'].edit_cells:
+                # like ED5.mlt, no file for an empty edit
+                continue
+            path = output_path(template, odb_file, FORMATS['mlt'],
+                               '-' + item.cookie)
+            with replacing(path) as tmp, open(tmp, 'w') as f:
+                odb.makeMLT(item, f)
+            written.append(path)
+    if cache:
+        cache.save()
+    return written
+
+def _export_job(job):
+    """Run export_project for a worker process; returns (odb file,
+       seconds, peak rss, error, files written, profiling figures)."""
+    odb_file = job[0]
+    start = time.perf_counter()
+    try:
+        written, error = export_project(*job), None
+    except Exception as e:
+        logging.error('%s: %s' % (odb_file, e or type(e).__name__))
+        written, error = [], str(e) or type(e).__name__
+    return (odb_file, time.perf_counter() - start, peak_rss(), error,
+            written, profiling.take())
+
+def _init_worker(debug, profile):
+    if debug:
+        logging.basicConfig(level=logging.DEBUG)
+    profiling.enable(profile)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='convert Lightworks projects to Final Cut 7 XML, EDL '
+        'or MLT')
+    parser.add_argument('inputs', metavar='PROJECT', nargs='+',
+                        help='project odb file or archive directory')
+    parser.add_argument('-f', '--format', action='append',
+                        choices=sorted(FORMATS),
+                        help='export format, may be given more than once '
+                        '(default: xmeml)')
+    parser.add_argument('-o', '--output', metavar='TEMPLATE',
+                        default='{dir}/{stem}{edit}.{ext}',
+                        help='output files (default: %(default)s); {dir}, '
+                        '{name} and {stem} are those of the odb file, {ext} '
+                        'is that of the format and {edit} is "-<cookie>" '
+                        'for the files of one edit (EDL, MLT)')
+    parser.add_argument('-j', '--jobs', type=int, default=1, metavar='N',
+                        help='export N projects in parallel')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='export everything again, do not keep the '
+                        'output of unchanged items')
+    parser.add_argument('-d', '--debug', action='store_true')
+    parser.add_argument('--profile', metavar='FILE', nargs='?', const='-',
+                        help='report time and counters per stage and file '
+                        '(to stderr, or FILE; JSON if FILE ends in .json)')
+    args = parser.parse_args()
+    if args.debug:
+        logging.basicConfig(level=logging.DEBUG)
+    if args.profile:
+        profiling.enable()
+
+    formats = args.format or ['xmeml']
+    files = []
+    for path in args.inputs:
+        found = project_files(path)
+        if not found:
+            logging.error('no project found in %s' % path)
+        files.extend(found)
+    outputs = set(output_path(args.output, f, 'x') for f in files)
+    if len(outputs) < len(files):
+        parser.error('output "%s" would be overwritten by several '
+                     'projects, use {dir} or {stem} in it' % args.output)
+    if overwrites_edits(args.output, formats):
+        parser.error('output "%s" would be overwritten by each edit, '
+                     'use {edit} in it' % args.output)
+
+    jobs = [(f, formats, args.output, not args.no_cache) for f in files]
+    if args.jobs > 1:
+        # a fresh process per project, so the peak memory is its own
+        try:
+            pool = concurrent.futures.ProcessPoolExecutor(
+                args.jobs, initializer=_init_worker,
+                initargs=(args.debug, bool(args.profile)),
+                max_tasks_per_child=1)
+        except TypeError:
+            # before Python 3.11 the peak is the worker's so far
+            pool = concurrent.futures.ProcessPoolExecutor(
+                args.jobs, initializer=_init_worker,
+                initargs=(args.debug, bool(args.profile)))
+        with pool:
+            results = list(pool.map(_export_job, jobs))
+    else:
+        # the peak memory is that of all projects so far
+        results = [_export_job(job) for job in jobs]
+
+    failed = 0
+    total = 0
+    for odb_file, seconds, rss, error, written, figures in results:
+        profiling.merge(figures)
+        total += seconds
+        failed += bool(error)
+        sys.stderr.write('%8.3fs  %8s  %-6s %s\n' % (
+            seconds, '%.1fMB' % (rss / 1e6) if rss else '-',
+            error and 'FAILED' or 'ok', odb_file))
+    if len(results) > 1:
+        sys.stderr.write('%8.3fs  %8s  %-6s total (%d projects)\n' % (
+            total, '', failed and 'FAILED' or 'ok', len(results)))
+    if args.profile:
+        profiling.dump(args.profile)
+    if failed:
+        sys.exit(1)
 
 if __name__ == '__main__':
-    odb = LW_ODB(".ignore\Ep6_Sc3-Archive.Archive\summary.odb")
-##    edl = odb.makeEDL()
-##    edl.savePremiere()
-
-    et = odb.makeFcpxml()
-    xmlstr = minidom.parseString(ET.tostring(et.getroot())).toprettyxml(indent="  ")
-    with open("output.xml", "wt") as f:
-        f.write(xmlstr)
+    main()
@@ -1,19 +1,138 @@
 #!/usr/bin/python3
 
+import logging, sys
 import xml.etree.ElementTree as ET
+import xml.parsers.expat
+import ed5decode
+import timeline
 
 """
 CyberLink PowerDirector format.
 """
 
 class PDS:
-    pass
+    """Reads a PowerDirector project in one pass, in bounded memory.
 
-tree = ET.parse('test-file(powerdirector).xml')
-root = tree.getroot()
-e = root.find('Aurora/Playable/TimelineChunk/Buffer')
+       The project is an XML file whose Aurora/Playable/TimelineChunk/
+       Buffer element holds the timeline as a second XML document, as
+       text.  The outer document is streamed through expat, which hands
+       over that text in pieces; each piece is fed straight to an
+       XMLPullParser for the inner document, and inner elements are
+       dropped as soon as they are read.  Neither document, nor the
+       buffer text, is ever held whole.
+
+       Clips become ed5decode.EditCell objects, so timeline() gives the
+       same timeline.Timeline the Lightworks exporters use.
+
+       Only the nesting below is known from a sample project.  The names
+       of clip elements and their attributes (CLIP_ATTRS, LIBRARY_ATTRS,
+       TIME_UNIT) are guesses, to be checked against a real file."""
+
+    BUFFER_PATH = ('Aurora', 'Playable', 'TimelineChunk', 'Buffer')
+    """path of the timeline buffer below the root element"""
+
+    CLIP_ATTRS = {'rec_in': 'TimelineStart', 'rec_out': 'TimelineEnd',
+                  'src_in': 'TrimIn', 'src_out': 'TrimOut',
+                  'reel': 'LibraryID'}
+    """attributes of a clip element; any element with the first two is
+       taken as a clip"""
+
+    LIBRARY_ATTRS = ('ID', 'FileName')
+    """attributes of a media entry in LIBRARY"""
+
+    TIME_UNIT = 10000000
+    """clip times are counted in 100ns"""
+
+    def __init__(self, filename, fps=30):
+        self.filename = filename
+        self.fps = fps
+        """frames per second for timeline()"""
+        self.info = {}
+        """attributes of the INFORMATION element"""
+        self.library = {}
+        """map from library id to media file"""
+        self.cells = []
+        """list of EditCell, one per clip"""
+        self.load()
+
+    def load(self, chunk_size=1024*1024):
+        inner = ET.XMLPullParser(events=('start', 'end'))
+        path = []
+        stack = []
+        tracks = {}
+
+        def start(name, attrs):
+            path.append(name)
+
+        def end(name):
+            path.pop()
+
+        def data(text):
+            if tuple(path[1:]) == self.BUFFER_PATH:
+                inner.feed(text)
+                self._events(inner, stack, tracks)
+
+        outer = xml.parsers.expat.ParserCreate()
+        outer.buffer_text = True
+        outer.StartElementHandler = start
+        outer.EndElementHandler = end
+        outer.CharacterDataHandler = data
+        with open(self.filename, 'rb') as f:
+            for block in iter(lambda: f.read(chunk_size), b''):
+                outer.Parse(block, False)
+            outer.Parse(b'', True)
+        inner.close()
+        self._events(inner, stack, tracks)
+
+    def _events(self, inner, stack, tracks):
+        # stack holds (element, track name) of the open elements
+        for event, elem in inner.read_events():
+            if event == 'start':
+                track = stack[-1][1] if stack else 'V1'
+                if 'TRACK' in elem.tag.upper():
+                    # V1, V2, ... and A1, A2, ... in document order
+                    kind = 'A' if 'AUDIO' in elem.tag.upper() else 'V'
+                    tracks[kind] = tracks.get(kind, 0) + 1
+                    track = '%s%d' % (kind, tracks[kind])
+                stack.append((elem, track))
+                continue
+
+            track = stack.pop()[1]
+            if elem.tag == 'INFORMATION':
+                self.info = dict(elem.attrib)
+            elif stack and stack[-1][0].tag == 'LIBRARY':
+                key, path = self.LIBRARY_ATTRS
+                if key in elem.attrib:
+                    self.library[elem.get(key)] = elem.get(path)
+            elif self.CLIP_ATTRS['rec_in'] in elem.attrib and \
+                 self.CLIP_ATTRS['rec_out'] in elem.attrib:
+                self.cells.append(self._cell(elem, track))
+            # done with it, keep only the open elements
+            elem.clear()
+            if stack:
+                stack[-1][0].remove(elem)
+
+    def _cell(self, elem, track):
+        times = {}
+        for field in ('rec_in', 'rec_out', 'src_in', 'src_out'):
+            try:
+                times[field] = int(elem.get(self.CLIP_ATTRS[field], 0)) \
+                               / self.TIME_UNIT
+            except ValueError:
+                logging.error('bad %s in %s' % (field, elem.tag))
+                times[field] = 0.0
+        if times['src_out'] == 0.0:
+            times['src_out'] = times['src_in'] + \
+                               times['rec_out'] - times['rec_in']
+        return ed5decode.EditCell(
+            track=track,
+            reel=elem.get(self.CLIP_ATTRS['reel'], elem.tag),
+            scope=track[0], speed=1.0, **times)
+
+    def timeline(self):
+        "the clips in frames, as used by the exporters"
+        return timeline.Timeline(self.cells, self.fps)
 
-tltree = ET.fromstring(e.text)
 
 # Project
 ## Aurora
@@ -34,3 +153,14 @@ tltree = ET.fromstring(e.text)
 ## INFORMATION
 ## LIBRARY
 ## TITLE
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        filename = sys.argv[1]
+    else:
+        filename = 'test-file(powerdirector).xml'
+    pds = PDS(filename)
+    tl = pds.timeline()
+    print('%d clips, %d media files' % (len(tl), len(pds.library)))
+    for track, clips in tl.tracks.items():
+        print(track, len(clips))
@@ -0,0 +1,342 @@
+#!/usr/bin/python3
+
+"""
+bench.py -- Time the decoders and exporters on synthetic projects.
+
+Copyright (C) 2015 William R. Zwicky <wrzwicky@pobox.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import argparse, contextlib, io, json, logging, os, platform, statistics
+import random, sys, tempfile, time, tracemalloc
+import ed5decode
+import lwsynth
+import odbfile
+import LW_ODB
+import timecode
+import timeline
+
+try:
+    import resource
+except ImportError:
+    # not on Windows
+    resource = None
+
+
+def cold():
+    'forget everything decoded so far, the next stage starts from files'
+    ed5decode.ed5_cache.clear()
+    odbfile._files.clear()
+
+def exporting(ed5, cells):
+    'give ed5 a fresh copy of its cells, the exports rewrite them'
+    def setup():
+        ed5.edit_cells = [c.copy() for c in cells]
+        ed5.title = None
+    return setup
+
+
+def stages(odb_file, edit_file, out_dir):
+    """Return list of (name, setup, run) of the measured stages on one
+       project.  setup is called before each run and is not timed."""
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        project = LW_ODB.LW_ODB(odb_file)
+    ed5 = ed5decode.ED5(edit_file)
+    cells = ed5.edit_cells
+
+    def load():
+        with contextlib.redirect_stdout(io.StringIO()):
+            LW_ODB.LW_ODB(odb_file)
+
+    # LW_ODB only maps the ed5 files, their cells are decoded by the
+    # first export that needs them
+    return [
+        ('ED5 decode', cold,
+         lambda: ed5decode.ED5(edit_file).edit_cells),
+        ('LW_ODB load', cold, load),
+        ('LW_ODB.makeEDL', None, project.makeEDL),
+        ('LW_ODB.makeFcpxml', None,
+         lambda: project.makeFcpxml(io.StringIO())),
+        ('ED5.mlt', exporting(ed5, cells),
+         lambda: ed5.mlt(os.path.join(out_dir, 'out.mlt'))),
+        ('ED5.edl', exporting(ed5, cells),
+         lambda: ed5.edl(os.path.join(out_dir, 'out.edl'), False)),
+    ]
+
+
+def measure(setup, run, repeat):
+    """Return dict of the run times and the peak of memory allocated by
+       Python during one more run.  That run is traced by tracemalloc
+       and not timed, tracing makes it a lot slower."""
+    times = []
+    for n in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    if setup:
+        setup()
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'seconds': times, 'min': min(times),
+            'median': statistics.median(times), 'peak_bytes': peak}
+
+
+def bench(directory, cuts, shots, tracks, repeat):
+    'write a project with cuts per track and measure all stages on it'
+    odb_file = lwsynth.write_project(directory, shots=shots, cuts=cuts,
+                                     tracks=tracks)
+    db = odbfile.load(odb_file)
+    edit = [r['Cookie'] for r in db.rows(typed=False)
+            if r['Type'] == 'edit'][0]
+    edit_file = os.path.join(directory, edit + '.ed5')
+    cells = len(ed5decode.ED5(edit_file).edit_cells)
+
+    result = {'cuts': cuts, 'shots': shots, 'tracks': list(tracks),
+              'cells': cells, 'edit_bytes': os.path.getsize(edit_file),
+              'stages': {}}
+    for name, setup, run in stages(odb_file, edit_file, directory):
+        m = measure(setup, run, repeat)
+        m['cells_per_second'] = cells / m['min'] if m['min'] else None
+        result['stages'][name] = m
+        sys.stderr.write('%8d cells  %-18s %9.4fs  %8.0f cells/s  %6.1f MB\n'
+                         % (cells, name, m['min'], m['cells_per_second'] or 0,
+                            m['peak_bytes'] / 1e6))
+    return result
+
+
+def best(run, repeat):
+    'return the shortest time of repeat runs'
+    times = []
+    for n in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def ed5_sizes(directory, repeat, sizes=(1e3, 1e4, 1e5, 1e6, 1e7, 1e8)):
+    """Time the segment walk (lazy ED5) and the full decode of edit files
+       from 1 KB to 100 MB.  Each track is a segment of 16 cuts, so big
+       files have many segments; seconds per MB should stay flat."""
+    results = []
+    for size in sizes:
+        # a track segment of 16 cuts takes about 2.1 KB
+        tracks = ['V%d' % (n + 1) for n in range(max(1, int(size // 2100)))]
+        project = os.path.join(directory, 'size%d' % size)
+        lwsynth.write_project(project, shots=20, tracks=tracks,
+                              cuts=16 if len(tracks) > 1 else int(size // 140))
+        edit_file = os.path.join(project, lwsynth.cookie(
+            'E000', lwsynth.FIRST_REEL + 20) + '.ed5')
+        mb = os.path.getsize(edit_file) / 1e6
+        index = best(lambda: ed5decode.ED5(edit_file, lazy=True), repeat)
+        decode = best(lambda: ed5decode.ED5(edit_file).edit_cells, repeat)
+        results.append({'bytes': os.path.getsize(edit_file),
+                        'segments': len(tracks) + 1,
+                        'index_seconds': index, 'decode_seconds': decode})
+        sys.stderr.write('%10d bytes  index %9.4fs %8.4fs/MB  '
+                         'decode %9.4fs %8.4fs/MB\n'
+                         % (results[-1]['bytes'], index, index / mb,
+                            decode, decode / mb))
+        cold()
+    return results
+
+def paired_cells(directory, cells, tracks=('V1', 'A1', 'A2')):
+    """Return about cells paired edit cells of a synthetic edit, as the
+       exports see them before merge_cuts; A1 repeats the cuts of V1."""
+    project = os.path.join(directory, 'cells%d' % cells)
+    shots = 50
+    lwsynth.write_project(project, shots=shots, tracks=tracks,
+                          cuts=cells // len(tracks))
+    edit_file = os.path.join(project, lwsynth.cookie(
+        'E000', lwsynth.FIRST_REEL + shots) + '.ed5')
+    return ed5decode.pair_cells(ed5decode.ED5(edit_file).edit_cells)
+
+def merge(directory, repeat, sizes=(5000, 50000)):
+    'time merge_cuts on 5k and 50k cells, cells per second should stay flat'
+    results = []
+    for size in sizes:
+        cells = paired_cells(directory, size)
+        merged = []
+        def setup():
+            merged[:] = [c.copy() for c in cells]
+        m = measure(setup, lambda: ed5decode.merge_cuts(merged), repeat)
+        m.update(cells=len(cells),
+                 merged=len(ed5decode.merge_cuts([c.copy() for c in cells])))
+        results.append(m)
+        sys.stderr.write('%8d cells  merge_cuts %9.4fs  %10.0f cells/s  '
+                         '%6.1f MB  %d left\n'
+                         % (len(cells), m['min'], len(cells) / m['min'],
+                            m['peak_bytes'] / 1e6, m['merged']))
+    return results
+
+def track_index(directory, repeat, size=100000, queries=10000):
+    """Time a TrackIndex of size cells on one track: building it, point
+       queries (against a linear scan), overlaps() and gaps()."""
+    cells = paired_cells(directory, size, tracks=('V1',))
+    tl = timeline.Timeline(cells, 25)
+    rng = random.Random(1)
+    frames = [rng.randrange(tl.rec_out[tl.tracks['V1'][-1]])
+              for n in range(queries)]
+    index = timeline.TrackIndex(tl, tl.tracks['V1'])
+
+    def scan(frame):
+        return [i for i in tl.tracks['V1']
+                if tl.rec_in[i] <= frame < tl.rec_out[i]]
+
+    result = {
+        'cells': len(cells),
+        'build_seconds': best(lambda: timeline.TrackIndex(tl, tl.tracks['V1']),
+                              repeat),
+        'at_seconds': best(lambda: [index.at(f) for f in frames],
+                           repeat) / queries,
+        'scan_seconds': best(lambda: [scan(f) for f in frames[:100]],
+                             repeat) / 100,
+        'overlaps_seconds': best(index.overlaps, repeat),
+        'gaps_seconds': best(index.gaps, repeat),
+        'overlaps': len(index.overlaps()), 'gaps': len(index.gaps()),
+    }
+    sys.stderr.write('%8d cells  build %.4fs  at %.2fus (scan %.0fus)  '
+                     'overlaps %.4fs  gaps %.4fs\n'
+                     % (len(cells), result['build_seconds'],
+                        result['at_seconds'] * 1e6,
+                        result['scan_seconds'] * 1e6,
+                        result['overlaps_seconds'], result['gaps_seconds']))
+    return result
+
+def strftime_t2hmsf(t, fps):
+    'ed5decode.t2hmsf as it was before timecode.Formatter, for comparison'
+    sec, frac = divmod(t, 1)
+    ff = round(frac * fps)
+    return time.strftime('%H:%M:%S', time.gmtime(sec)) + ':%02d' % ff
+
+def timecodes(directory, repeat, size=400000, fps=25):
+    """Time size timecodes (4 per cell of a 100k cell EDL) by the old
+       strftime t2hmsf, by ed5decode.t2hmsf one at a time and by the
+       Formatter for the whole column."""
+    rng = random.Random(1)
+    times = [rng.uniform(0, 3 * 3600) for n in range(size)]
+    tc = timecode.formatter(fps)
+    frames = [tc.frames(t) for t in times]
+    results = {'timecodes': size, 'fps': fps, 'seconds': {}}
+    for name, run in [
+            ('strftime t2hmsf', lambda: [strftime_t2hmsf(t, fps)
+                                         for t in times]),
+            ('ed5decode.t2hmsf', lambda: [ed5decode.t2hmsf(t, fps)
+                                          for t in times]),
+            ('Formatter.format_seconds', lambda: tc.format_seconds(times)),
+            ('Formatter.format_frames', lambda: tc.format_frames(frames))]:
+        seconds = results['seconds'][name] = best(run, repeat)
+        sys.stderr.write('%8d timecodes  %-24s %9.4fs  %10.0f/s\n'
+                         % (size, name, seconds, size / seconds))
+    return results
+
+def allocated(make):
+    'return the result of make() and the bytes it holds on to'
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = make()
+        return result, tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+def cell_memory(directory, repeat, size=100000):
+    """Bytes per edit cell: decoded EditCells with their values, and the
+       cell alone as EditCell and as the dict the decoder made before.
+       The values are shared by the last two, so they only count the
+       container."""
+    project = os.path.join(directory, 'memory%d' % size)
+    lwsynth.write_project(project, shots=50, tracks=('V1', 'A1', 'A2'),
+                          cuts=size // 6)
+    edit_file = os.path.join(project, lwsynth.cookie(
+        'E000', lwsynth.FIRST_REEL + 50) + '.ed5')
+    cold()
+    cells, decoded = allocated(lambda: ed5decode.ED5(edit_file).edit_cells)
+    n = len(cells)
+    copies, slots = allocated(lambda: [c.copy() for c in cells])
+    dicts, plain = allocated(lambda: [{name: c[name] for name in c.keys()}
+                                      for c in cells])
+    result = {'cells': n, 'decoded_per_cell': decoded / n,
+              'EditCell_per_cell': slots / n, 'dict_per_cell': plain / n}
+    sys.stderr.write('%8d cells  decoded %6.0f B/cell  EditCell %6.0f B/cell'
+                     '  dict %6.0f B/cell\n'
+                     % (n, decoded / n, slots / n, plain / n))
+    return result
+
+MICRO = {
+    'ed5-sizes': ed5_sizes,
+    'merge': merge,
+    'track-index': track_index,
+    'timecode': timecodes,
+    'cells': cell_memory,
+}
+"""benchmarks of single steps, run with --micro NAME"""
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='time decoding and export of synthetic projects')
+    parser.add_argument('-s', '--sizes', type=int, nargs='+',
+                        default=[100, 1000, 10000], metavar='CUTS',
+                        help='project sizes, in cuts per track')
+    parser.add_argument('--shots', type=int, default=50)
+    parser.add_argument('--tracks', default='V1,A1,A2',
+                        help='comma separated track names')
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help='timed runs of each stage')
+    parser.add_argument('-o', '--output', metavar='FILE', default='-',
+                        help='write the JSON report here (default stdout)')
+    parser.add_argument('--keep', metavar='DIR',
+                        help='write the projects here and keep them')
+    parser.add_argument('-m', '--micro', action='append',
+                        choices=sorted(MICRO),
+                        help='run this benchmark of a single step instead '
+                        'of the projects, may be given more than once')
+    args = parser.parse_args()
+    # the synthetic media files do not exist, don't warn about each one
+    logging.basicConfig(level=logging.ERROR)
+
+    report = {'python': platform.python_version(),
+              'platform': platform.platform(), 'repeat': args.repeat,
+              'projects': []}
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.micro:
+            report['micro'] = {}
+            args.sizes = []
+        for name in args.micro or []:
+            report['micro'][name] = MICRO[name](args.keep or tmp,
+                                                args.repeat)
+        for cuts in args.sizes:
+            directory = os.path.join(args.keep or tmp, 'cuts%d' % cuts)
+            report['projects'].append(bench(directory, cuts, args.shots,
+                                            args.tracks.split(','),
+                                            args.repeat))
+            cold()
+    if resource:
+        # kilobytes on Linux, bytes on macOS
+        report['maxrss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    with ed5decode.open_output(args.output) as f:
+        json.dump(report, f, indent=2)
+        f.write('\n')
+
+if __name__ == '__main__':
+    main()
@@ -19,28 +19,117 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
-import sys, struct, re, logging, os, glob, argparse, time, ntpath
-import xml.etree.ElementTree as ET
-from xml.dom import minidom
+import sys, struct, logging, os, glob, argparse, time, ntpath, mmap
+import array, collections, concurrent.futures, contextlib, gc, hashlib, math
+import pickle, sqlite3, threading
+
+import odbfile
+import profiling
+import timecode
+import timeline
+import xmlwriter
 
 VERSION = '0.2'
 
 class ED5:
 
-    def __init__(self, filename):
+    def __init__(self, filename, lazy=False, debug=None):
 
         self.childs = [] # a list of segments
         self.filename = filename
-        self.edit_cells = []
-        self.EHP = {}
+        self.lazy = lazy
+        # resolved once, the decoder checks it for every record
+        self.debug = isdebug() if debug is None else debug
+        self._edit_cells = []
+        self._EHP = {}
+        self._T = None
         self.title = None
         self.fps = 0 
         
-        f = open(filename, 'rb')
-        data = f.read()
-        f.close()
-        
-        self.childs = Segment.segments_from_data(data, self)
+        if lazy:
+            # only index the segments now, subsegments get decoded
+            # from the mapped file when their data is first needed
+            with profiling.stage('read'), self.mapped() as data:
+                self.childs = Segment.segments_from_data(data, self)
+                profiling.count('bytes read', len(data))
+        else:
+            with profiling.stage('read'):
+                f = open(filename, 'rb')
+                data = f.read()
+                f.close()
+                profiling.count('bytes read', len(data))
+
+            with profiling.stage('decode'):
+                self.childs = Segment.segments_from_data(data, self)
+
+    @property
+    def EHP(self):
+        self.decode(b'EHP')
+        return self._EHP
+
+    @property
+    def edit_cells(self):
+        self.decode(b'C')
+        return self._edit_cells
+
+    @edit_cells.setter
+    def edit_cells(self, cells):
+        self.decode(b'C')
+        self._edit_cells = cells
+
+    @property
+    def T(self):
+        "list of the T strings (ids) of all segments"
+        if self._T is None:
+            self.decode(b'T')
+            return [s.T for seg in self.childs for s in seg.childs
+                    if s.label == b'T']
+        return self._T
+
+    @contextlib.contextmanager
+    def mapped(self):
+        "map the ed5 file read-only"
+
+        f = open(self.filename, 'rb')
+        try:
+            if os.fstat(f.fileno()).st_size:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                data = b''    # empty files can not be mapped
+            try:
+                yield data
+            finally:
+                if data:
+                    try:
+                        data.close()
+                    except BufferError:
+                        # a traceback still holds views of the data; let
+                        # its own exception through, the map is closed
+                        # when they are collected
+                        pass
+        finally:
+            f.close()
+
+    def decode(self, *labels):
+        "decode pending subsegments with the given labels (default: all)"
+
+        pending = [s for seg in self.childs for s in seg.childs
+                   if not s.decoded and (not labels or s.label in labels)]
+        if not pending:
+            return
+        with profiling.stage('decode'), self.mapped() as data:
+            with memoryview(data) as view:
+                for s in pending:
+                    s.decode(view[s.offset:s.offset+s.size])
+
+    def __getstate__(self):
+        # pickle only the decoded data (e.g. for worker processes), the
+        # segment tree is of no use without the file data
+        self.decode()
+        state = self.__dict__.copy()
+        state['_T'] = self.T
+        state['childs'] = []
+        return state
 
     def proj_info(self):
         "read framerate and title from project ed5 file"
@@ -52,15 +141,10 @@ class ED5:
             logging.error('can not read project info (%s)' % proj_file)
             self.title = 'unknown'
         else:
-            p_f = open(proj_file)
-            for l in p_f.readlines():
-                l.strip()
-                if l.find('PROJECT_NAME') != -1:
-                    self.title = l[14:-2]
-                if l.find('PROJECT_RATE') != -1:
-                    self.fps = int(l[14:-2])
-                    break
-            p_f.close()
+            # parsed once per project, not once per edit
+            db = odbfile.load(proj_file)
+            self.title = db.title
+            self.fps = db.fps
 
     def export_preparation(self):
         "preprocessing that is common for any export format"
@@ -79,11 +163,12 @@ class ED5:
             logging.error('odd number of edit cells')
             return 0
         else:
-            for n in range(num-1, 0, -2):
-                self.edit_cells[n-1]['src_out'] = self.edit_cells[n]['src_out']
-                self.edit_cells[n-1]['rec_out'] = self.edit_cells[n]['rec_out']
-                del self.edit_cells[n]
+            self.edit_cells = pair_cells(self.edit_cells)
         return num
+
+    def timeline(self):
+        "the (prepared and merged) edit cells in frames"
+        return timeline.Timeline(self.edit_cells, self.fps)
             
     def mlt(self, mlt_filename):
         "dump the edit as MLT XML"
@@ -91,16 +176,22 @@ class ED5:
         if not self.export_preparation():
             return
 
-        et = ET.Element('mlt')
-                
-        #find all producers
+        with profiling.stage('write mlt'), open_output(mlt_filename) as f:
+            producers = list(self.mlt_producers())
+            # merge related cuts
+            self.edit_cells = merge_cuts(self.edit_cells)
+            write_mlt(f, producers, self.timeline())
+
+    def mlt_producers(self):
+        "generate (reel, path) for each source clip used by the edit"
+
         producers={}
         for c in self.edit_cells:
-            if c['reel'] in ['BL', 'dissolve']:
+            if c.reel in ['BL', 'dissolve']:
                 continue
-            if c['reel'] not in producers.keys():
+            if c.reel not in producers.keys():
                     d = os.path.dirname(os.path.abspath(self.filename))
-                    e = ED5(os.path.join(d, '%s.ed5' % c['reel']))
+                    e = ed5_cache.get(os.path.join(d, '%s.ed5' % c.reel))
                     match = list(filter(lambda x: x.startswith(
                         'ORIGINAL_FILE'), e.EHP.keys()))
                     if match:
@@ -112,8 +203,8 @@ class ED5:
                         #if search_dir:
                         #    path = os.path.join(search_dir, base)
                         if not os.access(path, os.F_OK):
-                            patern = os.path.join(d, '[SV]%s.*' % c['reel'][1:])
-                            arch_fallback = glob.glob(patern)
+                            arch_fallback = cookie_index(d).archive_files(
+                                c.reel)
                             if len(arch_fallback) == 1:
                                 path = arch_fallback[0]
                                 logging.warning(
@@ -123,67 +214,13 @@ class ED5:
                                 logging.warning('clip not found %s' %
                                                 path)
 
-                        producers[c['reel']] = path
-                        et_prod = ET.SubElement(et, 'producer',
-                                                id=c['reel'])
-                        et_prop = ET.SubElement(et_prod, 'property',
-                                                name='resource')
-                        et_prop.text = path
+                        producers[c.reel] = path
+                        yield c.reel, path
                     else:
                         logging.error('did not find path for "%s"',
-                                      c['reel'])
-                        producers[c['reel']] = None
-                        
-        # merge related cuts
-        [ a != b 
-        and a['reel']    == b['reel']    
-        and a['src_in']  == b['src_in']  
-        and a['src_out'] == b['src_out'] 
-        and a['rec_in']  == b['rec_in']  
-        and a['rec_out'] == b['rec_out'] 
-        
-        and not a.update(track=a['track']+' '+b['track'])
-        and not self.edit_cells.remove(b)
-        
-        for a in self.edit_cells
-        for b in self.edit_cells]
-            
+                                      c.reel)
+                        producers[c.reel] = None
 
-        # add to channel
-        channels= {}
-        for c in self.edit_cells:
-            v_tracks = re.findall('V[0-9]', c['track'])
-            a_tracks = re.findall('A[0-9]', c['track'])
-                             
-            if v_tracks:
-                if v_tracks[0] not in channels.keys():
-                    channels[v_tracks[0]] = [c]
-                else:
-                    channels[v_tracks[0]].append(c)
-
-        # add to xml
-        for channel in channels.keys():
-            et_pl = ET.SubElement(et, 'playlist', id=channel)
-            for c in channels[channel]:
-                 et_ent = ET.SubElement(et_pl, 'entry', {
-                                       'producer': c['reel'],
-                                       'in': "%d"%round(c['src_in']*self.fps),
-                                       'out':"%d"%round(c['src_out']*self.fps)
-                                       })
-                
-        # write xml
-        raw = ET.tostring(et, encoding="unicode")
-        reparsed = minidom.parseString(raw)
-        pretty = reparsed.toprettyxml(indent="  ")
-        
-        if mlt_filename == '-':
-            print(pretty)
-        else:
-            f = open(mlt_filename, 'w')
-            f.write(pretty)
-            f.close()
-                    
-        
     def edl(self, edl_filename, filename_as_reel , gvg_format=False):
         "dump the edit information as EDL"
  
@@ -194,43 +231,52 @@ class ED5:
         if not self.export_preparation():
             return
 
+        with profiling.stage('write edl'), open_output(edl_filename) as f:
+            for line in self.edl_lines(filename_as_reel, gvg_format):
+                f.write(line + '\n')
+
+    def edl_lines(self, filename_as_reel, gvg_format=False):
+        "generate the EDL line by line (after export_preparation)"
+
+        if 'name' in self.EHP:
+            edit_name = self.EHP['name'].split(' ', 3)[-1]
+        else:
+            edit_name = 'unknown edit'
+
+        yield 'TITLE: %s -- %s (%s) FRAMERATE: %d' % (
+            self.title, edit_name, os.path.basename(self.filename), self.fps)
+        if gvg_format:
+            yield 'GVG EDL [WARNING: ONLY 6 BYTES OF COOKIES USED]'
+            yield 'SMPTE FRAME CODE'
+        yield ''
+
+
         # ignore out of bound channels
         err = {}
         for c in self.edit_cells[:]:
-            if c['track'] not in 'V1 V2 A1 A2 A3 A4'.split():
-                if c['track'] not in err.keys():
-                    logging.error('channel %s invalid in EDL' % c['track'])
+            if c.track not in 'V1 V2 A1 A2 A3 A4'.split():
+                if c.track not in err.keys():
+                    logging.error('channel %s invalid in EDL' % c.track)
                 self.edit_cells.remove(c)
-                err[c['track']] = None
+                err[c.track] = None
                 
         # merge related cuts
-        [ a != b 
-        and a['reel']    == b['reel']    
-        and a['src_in']  == b['src_in']  
-        and a['src_out'] == b['src_out'] 
-        and a['rec_in']  == b['rec_in']  
-        and a['rec_out'] == b['rec_out'] 
-        
-        and not a.update(track=a['track']+' '+b['track'])
-        and not self.edit_cells.remove(b)
-        
-        for a in self.edit_cells
-        for b in self.edit_cells]
+        self.edit_cells = merge_cuts(self.edit_cells)
 
         # channel notation
         for c in self.edit_cells:
-            c['aud'] = ''
+            c.aud = ''
             
             if gvg_format:
-                if c['track'].find('V1') != -1:
-                    c['track'] = c['track'].replace('V1','V')
-                x = c['track'].split()
+                if c.track.find('V1') != -1:
+                    c.track = c.track.replace('V1','V')
+                x = c.track.split()
                 x.sort()
-                c['track'] = ''.join(x)
-                c['track'] = c['track'][:1] + c['track'][1:].replace('A','')
-                c['track'] = c['track'].ljust(6)
+                c.track = ''.join(x)
+                c.track = c.track[:1] + c.track[1:].replace('A','')
+                c.track = c.track.ljust(6)
             else:
-                tracks = set(c['track'].strip().split())
+                tracks = set(c.track.strip().split())
                 if 'V2' in tracks:
                     tracks.remove('V2')
                     tracks.add('V1')
@@ -239,101 +285,95 @@ class ED5:
                 tracks12V = tracks & {'A1', 'A2', 'V1'}
                 
                 if tracks34 == {'A3'}:
-                    c['aud'] = '\nAUD  3   '
+                    c.aud = '\nAUD  3   '
                 elif tracks34 == {'A4'}:
-                    c['aud'] = '\nAUD  4   '
+                    c.aud = '\nAUD  4   '
                 elif tracks34 == {'A3', 'A4'}:
-                    c['aud'] = '\nAUD  3  4'
+                    c.aud = '\nAUD  3  4'
 
                 if not tracks12V:
-                    c['track'] = 'NONE'
+                    c.track = 'NONE'
                 elif tracks12V == {'A1'}:
-                    c['track'] = 'A   '
+                    c.track = 'A   '
                 elif tracks12V == {'A1', 'V1'}:
-                    c['track'] = 'B   '
+                    c.track = 'B   '
                 elif tracks12V == {'V1'}:
-                    c['track'] = 'V   '
+                    c.track = 'V   '
                 elif tracks12V == {'A2'}:
-                    c['track'] = 'A2  '
+                    c.track = 'A2  '
                 elif tracks12V == {'A2', 'V1'}:
-                    c['track'] = 'A2/V'
+                    c.track = 'A2/V'
                 elif tracks12V == {'A1', 'A2'}:
-                    c['track'] = 'AA  '
+                    c.track = 'AA  '
                 elif tracks12V == {'A1', 'A2', 'V1'}:
-                    c['track'] = 'AA/V'
+                    c.track = 'AA/V'
 
         # edl numbering and operation code
-        num = 1
-        for c in self.edit_cells:
-            if not 'duration' in c.keys():
-                c['duration'] = '   '
-            if not 'operation' in c.keys():
-                c['operation'] = 'C   '
-            if gvg_format:
-                c['number'] = '%04d' % num
-            else:
-                c['number'] = '%03d' % num
-            if c['reel']  == 'dissolve':
-                next_c = self.edit_cells[self.edit_cells.index(c) +1]
-                next_c['duration'] = '%03d' % round(c['src_out'] * self.fps)
-                next_c['rec_in'] = c['rec_in']
-                next_c['operation'] = 'D   '
-                if gvg_format:   
-                    next_c['number'] = '%04d' % (num - 1)
-                else:
-                    next_c['number'] = '%03d' % (num - 1)
-                self.edit_cells.remove(c)
-            else:
+        frames = timeline.frame_counter(self.fps)
+        fmt = '%04d' if gvg_format else '%03d'
+        num = 0
+        cells = []
+        for i, t in timeline.resolve_transitions(self.edit_cells):
+            c = self.edit_cells[i]
+            if t is None:
                 num += 1
+                if c.duration is None:
+                    c.duration = '   '
+                if c.operation is None:
+                    c.operation = 'C   '
+            else:
+                # one event with the clip before, that it blends from
+                t = self.edit_cells[t]
+                c.duration = '%03d' % frames(t.src_out)
+                c.rec_in = t.rec_in
+                c.operation = timeline.TRANSITIONS[t.reel].ljust(4)
+            c.number = fmt % num
+            cells.append(c)
+        self.edit_cells = cells
 
         # a-mode sorting
         events = {}
         for c in self.edit_cells:
-            if c['number'] not in events.keys():
-                events[c['number']] = [c['number'],c['rec_in'],[c]]
+            if c.number not in events.keys():
+                events[c.number] = [c.number,c.rec_in,[c]]
             else:
-                events[c['number']][2].append(c)
+                events[c.number][2].append(c)
         sort_list = list(events.values())
         sort_list.sort(key=lambda x: x[1])
         new_cells = []
         for n, x in enumerate(sort_list):
             for c in x[2]:
                 if gvg_format:
-                    c['number'] = '%04d' % n
+                    c.number = '%04d' % n
                 else:
-                    c['number'] = '%03d' % n
+                    c.number = '%03d' % n
                 new_cells.append(c)
         self.edit_cells = new_cells
-        
-                
-                
-        if 'name' in self.EHP:
-            edit_name = self.EHP['name'].split(' ', 3)[-1]
-        else:
-            edit_name = 'unknown edit'
 
-        output = []
-        output.append('TITLE: %s -- %s (%s) FRAMERATE: %d' % (
-            self.title, edit_name, os.path.basename(self.filename), self.fps))
-        if gvg_format:
-            output.append('GVG EDL [WARNING: ONLY 6 BYTES OF COOKIES USED]')
-            output.append('SMPTE FRAME CODE')
-        output.append('')
+        # all timecodes in one batch
+        tl = self.timeline()
+        cells = tl.cells
+        if self.fps > 0:
+            codes = timecode.formatter(self.fps).format_frames(
+                f for clip in zip(tl.src_in, tl.src_out, tl.rec_in, tl.rec_out)
+                for f in clip)
+        else:
+            codes = [t2hmsf(t, self.fps) for c in cells
+                     for t in (c.src_in, c.src_out, c.rec_in, c.rec_out)]
+        codes = iter(codes)
 
         reels = {}              
-        for c in self.edit_cells[:]:
-            for n in ['src_in', 'src_out', 'rec_in', 'rec_out']:
-                if n in c.keys():
-                    c[n+'_hmsf'] = t2hmsf(c[n], self.fps)
+        for c, (src_in, src_out, rec_in, rec_out) in zip(cells,
+                                                          zip(*[codes] * 4)):
                     
-            if c['reel'] == 'BL' and gvg_format:
-                c['reel'] == 'BLK'
+            if c.reel == 'BL' and gvg_format:
+                c.reel == 'BLK'
                     
             # clip names as reel
-            if c['reel'] not in ['UNKNOWN', 'BLK', 'BL']:
-                #if not c['reel'] in reels.keys():
+            if c.reel not in ['UNKNOWN', 'BLK', 'BL']:
+                #if not c.reel in reels.keys():
                     d = os.path.dirname(os.path.abspath(self.filename))
-                    e = ED5(os.path.join(d, '%s.ed5' % c['reel']))
+                    e = ed5_cache.get(os.path.join(d, '%s.ed5' % c.reel))
                     match = list(filter(lambda x: x.startswith(
                         'ORIGINAL_FILE'), e.EHP.keys()))
                     if match:
@@ -349,281 +389,874 @@ class ED5:
                             if gvg_format and len(short) > 6:
                                 logging.warning('filename to long for EDL: %s'
                                                 % base)
-                                reels[c['reel']] = c['reel'][2:]
+                                reels[c.reel] = c.reel[2:]
                             elif len(short) > 8:
                                 logging.warning('filename to long for EDL: %s'
                                                 % base)
-                                reels[c['reel']] = c['reel']
+                                reels[c.reel] = c.reel
                             else:
-                                reels[c['reel']] = short
+                                reels[c.reel] = short
                         else:
                             if gvg_format:
-                                reels[c['reel']] = c['reel'][2:]
+                                reels[c.reel] = c.reel[2:]
                             else:
-                                reels[c['reel']] = c['reel']
-                        c['from_clip'] = '\n* FROM CLIP NAME: %s' % base
-                        c['reel'] = 'AX'
-            if not 'from_clip' in c.keys():
-                c['from_clip'] =''
-            if c['reel'] in reels.keys():
-                c['reel'] = reels[c['reel']]
+                                reels[c.reel] = c.reel
+                        c.from_clip = '\n* FROM CLIP NAME: %s' % base
+                        c.reel = 'AX'
+            if c.from_clip is None:
+                c.from_clip =''
+            if c.reel in reels.keys():
+                c.reel = reels[c.reel]
                 
             if gvg_format:
-                output.append(' '.join([
-                    c['number'], c['reel'].ljust(6), c['track'],
-                    c['operation'], c['duration'],
-                    c['src_in_hmsf'], c['src_out_hmsf'],
-                    c['rec_in_hmsf'], c['rec_out_hmsf'],
-                    c['aud'], c['from_clip']
-                    ]))
+                yield ' '.join([
+                    c.number, c.reel.ljust(6), c.track,
+                    c.operation, c.duration,
+                    src_in, src_out, rec_in, rec_out,
+                    c.aud, c.from_clip
+                    ])
             else:
-                output.append(' '.join([
-                    c['number'],'', c['reel'].ljust(8),'', c['track'],'',
-                    c['operation'], c['duration'],
-                    c['src_in_hmsf'], c['src_out_hmsf'],
-                    c['rec_in_hmsf'], c['rec_out_hmsf'],
-                    c['aud'], c['from_clip']
-                    ]))
-                
-        output.append('')
-        if edl_filename == '-':
-            sys.stdout.write('\n'.join(output))
-        else:
-            f = open(edl_filename, 'w')
-            f.write('\n'.join(output))
-            f.close()
+                yield ' '.join([
+                    c.number,'', c.reel.ljust(8),'', c.track,'',
+                    c.operation, c.duration,
+                    src_in, src_out, rec_in, rec_out,
+                    c.aud, c.from_clip
+                    ])
 
     def fcpxml(self, fcp_filename):
         "dump the edit as Final Cut XML"
         pass
 
             
+class EditCell:
+    """One edit record of a C subsegment.
+
+       Times are in seconds.  Cells read from an ed5 file carry either
+       the in times (rec_in, src_in) or the out times (rec_out, src_out)
+       until export_preparation merges each pair.  Unset fields are None.
+       Dict style access (cell['reel']) still works for older code."""
+
+    __slots__ = ('track', 'reel', 'scope', 'speed',
+                 'src_in', 'src_out', 'rec_in', 'rec_out', 'id1', 'id2',
+                 # filled in by the EDL export
+                 'number', 'operation', 'duration', 'aud', 'from_clip')
+
+    def __init__(self, track=None, reel=None, scope=None, speed=None,
+                 src_in=None, src_out=None, rec_in=None, rec_out=None,
+                 id1=None, id2=None):
+        self.track = track
+        self.reel = reel
+        self.scope = scope
+        self.speed = speed
+        self.src_in = src_in
+        self.src_out = src_out
+        self.rec_in = rec_in
+        self.rec_out = rec_out
+        self.id1 = id1
+        self.id2 = id2
+        self.number = None
+        self.operation = None
+        self.duration = None
+        self.aud = None
+        self.from_clip = None
+
+    def copy(self):
+        c = EditCell.__new__(EditCell)
+        for name in self.__slots__:
+            setattr(c, name, getattr(self, name))
+        return c
+
+    def keys(self):
+        return [name for name in self.__slots__
+                if getattr(self, name) is not None]
+
+    def get(self, key, default=None):
+        if key in self.__slots__ and getattr(self, key) is not None:
+            return getattr(self, key)
+        return default
+
+    def __getitem__(self, key):
+        if key in self.__slots__ and getattr(self, key) is not None:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self.keys()
+
+    def __repr__(self):
+        return 'EditCell(%s)' % ', '.join('%s=%r' % (name, getattr(self, name))
+                                          for name in self.keys())
+
+            
 class Segment:
 
     def segments_from_data(data, parent):
         'return a list of Segments instances from raw data'
 
+        # walk the buffer by offset; every Segment gets a memoryview
+        # slice, so the file data is never copied
+        view = memoryview(data)
         segments = []
-        while data:
+        offset = 0
+        while offset < len(view):
             
             # catch alignment errors
-            if not data.startswith(b'$\0'):
+            if view[offset:offset+2] != b'$\0':
                 logging.error("magic sequence not found")
                 sys.exit(1)
                 
-            label, flags, a, b, head_len, tail = read_segment(data)
+            label, flags, a, b, head_len, tail = read_segment(view, offset)
             
-            dprint('-'*5, 'segment_nr:', len(segments), '-'*35)
+            if parent.debug:
+                print('-'*5, 'segment_nr:', len(segments), '-'*35)
             
-            segments.append(Segment(data[:head_len+b], parent))
-            data = data[head_len+b:]
+            segments.append(Segment(view[offset:offset+head_len+b], parent,
+                                    offset))
+            offset += head_len + b
         return segments
     
-    def __init__(self, data, parent):
+    def __init__(self, data, parent, offset=0):
 
         self.parent = parent
         self.childs = []
+        self.offset = offset
+        self.debug = parent.debug
         
         label, flags, a, b, head_len, tail = read_segment(data)
 
-        if isdebug():
+        if self.debug:
             print('segment label: %s\tflags: %s,\t(b=) len: %d' %
                 (label, flags, b))
             hexdump(data, n=head_len)
 
-            dprint('subsegment index len (a=): %d' % a )
+            print('subsegment index len (a=): %d' % a )
             hexdump(tail, n=a)
 
         subsegment_data = tail[a:]
-        self.childs = Subsegment.subsegments_from_data(subsegment_data, self) 
+        self.childs = Subsegment.subsegments_from_data(
+            subsegment_data, self, offset + head_len + a)
         
         
 class Subsegment:
 
-    def subsegments_from_data(data, parent):
+    def subsegments_from_data(data, parent, base=0):
         'return a list of Subsegments instances from raw data'
 
+        view = memoryview(data)
         subsegments = []
-        
-        while data:
-            label, flags, a, b, head_len, tail = read_segment(data)
-            subsegments.append(Subsegment(data[:head_len+a], parent))          
-            data = data[head_len+a:]
+        offset = 0
+        while offset < len(view):
+            label, flags, a, b, head_len, tail = read_segment(view, offset)
+            subsegments.append(Subsegment(view[offset:offset+head_len+a],
+                                          parent, base + offset))
+            offset += head_len + a
         return subsegments
 
-    def __init__(self, data, parent):
+    def __init__(self, data, parent, offset=0):
 
         self.parent = parent
         self.childs = []
+        self.debug = parent.debug
+        self.offset = offset    # position and size inside the ed5 file
+        self.size = len(data)
+        self.decoded = False
         
         label, flags, a, b, head_len, tail = read_segment(data)
         self.label = label
         
-        if isdebug():
+        if self.debug:
             print ('subsegment -- label: %s, flags %s, (a=) len: %d, b: %d'
                     % (label, flags, a, b))
             hexdump(data, n=head_len)
+        if not parent.parent.lazy:
+            self.decode(data)
+
+    def decode(self, data):
+        'decode the content of this subsegment'
+
+        self.decoded = True
+        label, flags, a, b, head_len, tail = read_segment(data)
         if label == b'EHP':
             self.label_EHP(tail)
         elif label == b'T':
-            self.T = tail[1:-1]
-            dprint('T -- %s' % self.T)
+            self.T = bytes(tail[1:-1])
+            if self.debug:
+                print('T -- %s' % self.T)
         elif label == b'A':
             self.label_A(tail)
         elif label == b'C':
             self.label_C(tail)
         else:
-            if isdebug():            
+            if self.debug:            
                 print("unsupported segment:", label)
                 hexdump(tail)
 
     def label_EHP(self, tail):
-            unknown=tail[:2]
-            count = struct.unpack('i', tail[2:6])[0]
-            dprint('EHP -- unknown: %s, c: %d' % (unknown, count))
-            parts=tail[6:].split(b'\0')
+            unknown = bytes(tail[:2])
+            count = struct.unpack_from('i', tail, 2)[0]
+            if self.debug:
+                print('EHP -- unknown: %s, c: %d' % (unknown, count))
+            parts = bytes(tail[6:]).split(b'\0')
             idx = 0
             while idx+2 < len(parts):
                 name = parts[idx]
                 value = parts[idx+1]
                 typ = parts[idx+2]
                 idx += 3
-                dprint(name, ':', value, ':', typ)
-                self.parent.parent.EHP[name.decode()] = value.decode()
+                if self.debug:
+                    print(name, ':', value, ':', typ)
+                self.parent.parent._EHP[name.decode()] = value.decode()
                   
     def label_A(self, tail):
-            num_str = tail[:4]
-            tail = tail[4:]
-            num = struct.unpack('i', num_str)[0]
-            dprint('A -- num:', num)
-            while tail:
-                t = struct.unpack('d', tail[:8])[0]
-                unknown1 = ' '.join(map(lambda x: "%02x" % x, tail[8:11]))
-                gain = struct.unpack('I', tail[11:15])[0]
-                unknown2 = ' '.join(map(lambda x: "%02x" % x, tail[15:21]))
-                tail = tail[21:]
-                dprint('t=%03.2f\t[%s] gain=%3.1f\t [%s]'
+            num = struct.unpack_from('i', tail)[0]
+            if not self.debug:
+                return  # the envelope is not used, only printed
+            print('A -- num:', num)
+            offset = 4
+            while offset < len(tail):
+                t = struct.unpack_from('d', tail, offset)[0]
+                unknown1 = ' '.join(map(lambda x: "%02x" % x,
+                                        tail[offset+8:offset+11]))
+                gain = struct.unpack_from('I', tail, offset+11)[0]
+                unknown2 = ' '.join(map(lambda x: "%02x" % x,
+                                        tail[offset+15:offset+21]))
+                offset += 21
+                print('t=%03.2f\t[%s] gain=%3.1f\t [%s]'
                       % (t, unknown1, int2db(gain), unknown2))
 
                 
     def label_C(self, tail):
 
-        first_byte=tail[:1] # allways 2 (?)
-        ref, track,sub, sub2, tail = tail[1:].split(b'\0', 4)
-        if isdebug():
+        first_byte = bytes(tail[:1]) # allways 2 (?)
+        ref, offset = read_cstring(tail, 1)
+        track, offset = read_cstring(tail, offset)
+        sub, offset = read_cstring(tail, offset)
+        sub2, offset = read_cstring(tail, offset)
+        if self.debug:
             print('first_byte:', first_byte)
             print('ref:', ref)
             print('track:', track)
             print('sub:', sub)
             print('sub2:', sub2)
-            hexdump(tail[:12])
-        t, num = struct.unpack('dI', tail[:12])
-        dprint('t:', t, 'num:', num)
-        tail = (tail[12:])
-        #hexdump(tail)
-        while tail:
-            if isdebug():
+            hexdump(tail[offset:offset+12])
+        t, num = struct.unpack_from('dI', tail, offset)
+        if self.debug:
+            print('t:', t, 'num:', num)
+        offset += 12
+        end = len(tail)
+        #hexdump(tail[offset:])
+        while offset < end:
+            if self.debug:
                 print('jump over offset: ', 17)
-                hexdump(tail[:17])
-            a, b = struct.unpack('II', tail[:8])
-            dprint('a:', a, 'b:', b, '(a+b == num)')
+                hexdump(tail[offset:offset+17])
+            a, b = struct.unpack_from('II', tail, offset)
+            if self.debug:
+                print('a:', a, 'b:', b, '(a+b == num)')
             if b == 0xf0000000:
-                if isdebug():
+                if self.debug:
                     print('no usual edit...')
-                    hexdump(tail)
-                tail = b''
+                    hexdump(tail[offset:])
+                end = offset
             #### 17 bytes unknown 
-            tail = tail[17:]
+            offset += 17
             
             # num times edit information of 64 byte length
-            while tail:
-                dprint('--------------------------------------')
-                data = tail[:0x40]
-                tail = tail[0x40:]
+            records = tail[offset:end]
+            offset = end
+            profiling.count('bytes decoded', len(records))
+            profiling.count('records', len(records) // EDIT_RECORD.size)
+            directory = os.path.dirname(os.path.abspath(
+                self.parent.parent.filename))
+            if self.debug:
+                # record by record, with all the debug output
+                for n in range(0, len(records), EDIT_RECORD.size):
+                    self.parent.parent._edit_cells.append(self.edit_cell(
+                        records[n:n+EDIT_RECORD.size], track, directory))
+            else:
+                with profiling.stage('edit records'):
+                    self.parent.parent._edit_cells.extend(
+                        cells_from_columns(decode_edit_records(records),
+                                           track.decode(), directory))
 
-                edit = { 'track': track.decode()}
-                
-                # unknown floats
-                x, speed = struct.unpack('ff',data[8:16])
-                edit['speed'] = speed
-                if isdebug():
-                    print('x: %f\tspeed: %f' % (x, speed))
-                    hexdump(data[:16])
-
-                t1, t2 = struct.unpack('dd', data[16:32])
-                # 1 or 4 at byte 28-32 denote in/out time 
-                t_sel = struct.unpack('i', data[44:48])[0]
-                if t_sel == 1:
-                    edit['rec_in'] = t1
-                    edit['src_in'] = t2
-                    dprint('Rec IN: %.2f   Src IN: %.2f' % (t1, t2))
-                elif t_sel == 4:
-                    edit['rec_out'] = t1
-                    edit['src_out'] = t2
-                    dprint('Rec OUT: %.2f  Src OUT: %.2f' % (t1, t2))
-                else:
-                    logging.error('time selector "0x%x" unknown' % t_sel)
-                if isdebug():
-                    hexdump(data[16:])
-
-                #reel 
-                r = struct.unpack('i', data[32:36])[0]
-                if r == 1:
-                    reel = 'BL'
-                elif r == 0xb655:
-                    reel = 'dissolve'
-                else:
-                    directory = os.path.dirname(os.path.abspath(
-                        self.parent.parent.filename))
-                    reel = int2reel(r, directory)
-                edit['reel'] = reel
-                    
-                #type of edit
-                scope = chr(data[42])
-                edit['scope'] = scope 
-                                
-                dprint('Reel: %s\tType of Edit: %c' % (reel, scope)) 
-
-                #EDL IDs
-                id1, id2 = struct.unpack('ii', data[52:60])
-                edit['id1'] = id1
-                edit['id2'] = id2
-                dprint('ID-1: %d\t ID-2: %d' % (id1, id2))
-
-                self.parent.parent.edit_cells.append(edit)
+    def edit_cell(self, data, track, directory):
+        'decode one 64 byte edit record (reference for decode_edit_records)'
+
+        if self.debug:
+            print('--------------------------------------')
+        edit = EditCell(track.decode())
+        
+        # unknown floats
+        x, speed = struct.unpack_from('<ff', data, 8)
+        edit.speed = speed
+        if self.debug:
+            print('x: %f\tspeed: %f' % (x, speed))
+            hexdump(data[:16])
+
+        t1, t2 = struct.unpack_from('<dd', data, 16)
+        # 1 or 4 at byte 28-32 denote in/out time 
+        t_sel = struct.unpack_from('<i', data, 44)[0]
+        if t_sel == 1:
+            edit.rec_in = t1
+            edit.src_in = t2
+            if self.debug:
+                print('Rec IN: %.2f   Src IN: %.2f' % (t1, t2))
+        elif t_sel == 4:
+            edit.rec_out = t1
+            edit.src_out = t2
+            if self.debug:
+                print('Rec OUT: %.2f  Src OUT: %.2f' % (t1, t2))
+        else:
+            logging.error('time selector "0x%x" unknown' % t_sel)
+        if self.debug:
+            hexdump(data[16:])
+
+        #reel 
+        r = struct.unpack_from('<i', data, 32)[0]
+        if r == 1:
+            reel = 'BL'
+        elif r == 0xb655:
+            reel = 'dissolve'
+        else:
+            reel = int2reel(r, directory)
+        edit.reel = reel
+            
+        #type of edit
+        scope = chr(data[42])
+        edit.scope = scope 
+                        
+        if self.debug:
+            print('Reel: %s\tType of Edit: %c' % (reel, scope)) 
+
+        #EDL IDs
+        id1, id2 = struct.unpack_from('<ii', data, 52)
+        edit.id1 = id1
+        edit.id2 = id2
+        if self.debug:
+            print('ID-1: %d\t ID-2: %d' % (id1, id2))
+
+        return edit
                     
 
-def read_segment(data):
-    'read one segment out of a list'
-    label, tail = data.split(b'\0', 1)
-    flags = tail[:2]
-    a, b = struct.unpack('ii', tail[2:10])
-    tail = tail[10:]
+# layout of one 64 byte edit record of a C subsegment:
+# x, speed, rec time, src time, reel, scope, time selector, id1, id2
+EDIT_RECORD = struct.Struct('<8xffddi6xcxi4xii4x')
+
+def decode_edit_records(data):
+    """decode a run of edit records at once into columns
+
+       Returns a dict of equally long columns: 'x', 'speed' (float
+       arrays), 't1', 't2' (double arrays), 'reel', 't_sel', 'id1',
+       'id2' (int arrays) and 'scope' (bytes)."""
+
+    n, rest = divmod(len(data), EDIT_RECORD.size)
+    if rest:
+        logging.error('ignoring %d bytes of incomplete edit record' % rest)
+        data = data[:n*EDIT_RECORD.size]
+    columns = list(zip(*EDIT_RECORD.iter_unpack(data))) or [()] * 9
+    x, speed, t1, t2, reel, scope, t_sel, id1, id2 = columns
+    return {
+        'x': array.array('f', x),
+        'speed': array.array('f', speed),
+        't1': array.array('d', t1),
+        't2': array.array('d', t2),
+        'reel': array.array('i', reel),
+        'scope': b''.join(scope),
+        't_sel': array.array('i', t_sel),
+        'id1': array.array('i', id1),
+        'id2': array.array('i', id2),
+        }
+
+def cells_from_columns(columns, track, directory):
+    'return EditCells for the columns of decode_edit_records'
+
+    reels = {1: 'BL', 0xb655: 'dissolve'}
+    cells = []
+    for speed, t1, t2, r, scope, t_sel, id1, id2 in zip(
+            columns['speed'], columns['t1'], columns['t2'], columns['reel'],
+            columns['scope'], columns['t_sel'], columns['id1'],
+            columns['id2']):
+        reel = reels.get(r)
+        if reel is None:
+            reel = reels[r] = int2reel(r, directory)
+        if t_sel == 1:
+            c = EditCell(track, reel, chr(scope), speed,
+                         src_in=t2, rec_in=t1, id1=id1, id2=id2)
+        elif t_sel == 4:
+            c = EditCell(track, reel, chr(scope), speed,
+                         src_out=t2, rec_out=t1, id1=id1, id2=id2)
+        else:
+            logging.error('time selector "0x%x" unknown' % t_sel)
+            c = EditCell(track, reel, chr(scope), speed, id1=id1, id2=id2)
+        cells.append(c)
+    return cells
+
+
+class ED5Cache:
+    """LRU cache of lazily loaded ED5 objects, keyed by file path.
+
+       An entry is decoded again when the mtime or size of its file
+       changed.  The cache keeps at most max_entries objects and about
+       max_bytes of ed5 data (measured by file size)."""
+
+    def __init__(self, max_entries=1024, max_bytes=256*1024*1024, store=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.store = store
+        """optional ED5Store, consulted before decoding a file"""
+        self.entries = collections.OrderedDict()
+        """map from path to (mtime, size, ED5), oldest first"""
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, filename):
+        'return the (lazy) ED5 of filename, decoding it only if needed'
+
+        path = os.path.abspath(filename)
+        st = os.stat(path)
+        entry = self.entries.get(path)
+        if entry is not None:
+            if entry[:2] == (st.st_mtime_ns, st.st_size):
+                self.hits += 1
+                profiling.count('ed5 cache hits')
+                self.entries.move_to_end(path)
+                return entry[2]
+            self.discard(path)
+        self.misses += 1
+        profiling.count('ed5 cache misses')
+        ed5 = self.store and self.store.load(path)
+        if ed5:
+            self.add(path, ed5, save=False)
+        elif self.store:
+            # decode everything, it goes to the store anyway
+            ed5 = ED5(path)
+            self.add(path, ed5)
+        else:
+            ed5 = ED5(path, lazy=True)
+            self.add(path, ed5)
+        return ed5
+
+    def cached(self, filename):
+        'return the ED5 of filename if it needs no decoding, else None'
+
+        path = os.path.abspath(filename)
+        entry = self.entries.get(path)
+        if entry is not None:
+            st = os.stat(path)
+            if entry[:2] == (st.st_mtime_ns, st.st_size):
+                return self.get(path)
+        ed5 = self.store and self.store.load(path)
+        if ed5:
+            self.add(path, ed5, save=False)
+        return ed5 or None
+
+    def add(self, filename, ed5, save=True):
+        'put an ED5 decoded elsewhere (e.g. by a worker) into the cache'
+
+        path = os.path.abspath(filename)
+        st = os.stat(path)
+        if save and self.store:
+            self.store.save(path, ed5)
+        self.discard(path)
+        self.entries[path] = (st.st_mtime_ns, st.st_size, ed5)
+        self.bytes += st.st_size
+        while self.entries and (len(self.entries) > self.max_entries
+                                or self.bytes > self.max_bytes):
+            self.discard(next(iter(self.entries)))
+
+    def discard(self, filename):
+        'drop the entry of filename if present'
+
+        entry = self.entries.pop(os.path.abspath(filename), None)
+        if entry is not None:
+            self.bytes -= entry[1]
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+
+# ED5 objects of the shots referenced by edits; shared by the exporters
+# and LW_ODB
+ed5_cache = ED5Cache()
+
+
+class ED5Store:
+    """Persistent cache of decoded ed5 files in a sqlite database.
+
+       Keeps EHP, T and the edit cells (as columns) of each file, keyed
+       by path.  An entry is used while size and mtime of the file are
+       unchanged, or if its content hash still matches.  When the stored
+       data grows beyond max_bytes, the least recently used entries are
+       deleted."""
+
+    FIELDS = ('track', 'reel', 'scope', 'speed', 'src_in', 'src_out',
+              'rec_in', 'rec_out', 'id1', 'id2')
+
+    FLUSH_BYTES = 64*1024*1024
+    """flush() when this much data waits to be written"""
+
+    def __init__(self, filename, max_bytes=1024*1024*1024):
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._db = None
+        self._pid = None
+        self._used = {}
+        """map from path to mtime of the hits not written yet, see flush()"""
+        self._saved = {}
+        """map from path to the row of each save() not written yet"""
+        self._pending = 0
+        """bytes of data in _saved"""
+        self._total = None
+        """bytes of data in the table, as far as known here"""
+
+    @property
+    def db(self):
+        # connections can not be shared with forked worker processes
+        if self._db is None or self._pid != os.getpid():
+            self._db = sqlite3.connect(self.filename, timeout=60)
+            self._pid = os.getpid()
+            self._db.execute('CREATE TABLE IF NOT EXISTS ed5 ('
+                             'path TEXT PRIMARY KEY, size INTEGER, '
+                             'mtime INTEGER, hash BLOB, used REAL, '
+                             'data BLOB)')
+        return self._db
+
+    def load(self, filename):
+        'return the stored ED5 of filename, or None if unknown or changed'
+
+        path = os.path.abspath(filename)
+        st = os.stat(path)
+        row = self.db.execute('SELECT size, mtime, hash, data FROM ed5 '
+                              'WHERE path = ?', (path,)).fetchone()
+        if row is None or row[0] != st.st_size:
+            self.misses += 1
+            profiling.count('ed5 store misses')
+            return None
+        if row[1] != st.st_mtime_ns:
+            if row[2] != file_hash(path):
+                self.misses += 1
+                profiling.count('ed5 store misses')
+                return None
+        self.hits += 1
+        profiling.count('ed5 store hits')
+        # a commit per hit is slower than decoding small files again
+        self._used[path] = st.st_mtime_ns
+        return self.unpack(path, row[3])
+
+    def save(self, filename, ed5):
+        'store the decoded data of ed5 (which must be unchanged)'
+
+        path = os.path.abspath(filename)
+        st = os.stat(path)
+        data = self.pack(ed5)
+        # like the hits, rows are written by flush() in one transaction
+        old = self._saved.get(path)
+        if old is not None:
+            self._pending -= len(old[5])
+        self._saved[path] = (path, st.st_size, st.st_mtime_ns,
+                             file_hash(path), time.time(), data)
+        self._pending += len(data)
+        if self._pending > self.FLUSH_BYTES:
+            self.flush()
+
+    def flush(self):
+        """write the rows saved and the hits since the last flush, then
+           evict entries if the data grew beyond max_bytes"""
+        if not self._used and not self._saved:
+            return
+        with self.db:
+            if self._total is None:
+                self._total = self.db.execute(
+                    'SELECT TOTAL(LENGTH(data)) FROM ed5').fetchone()[0]
+            self.db.executemany('INSERT OR REPLACE INTO ed5 VALUES '
+                                '(?, ?, ?, ?, ?, ?)', self._saved.values())
+            # replaced rows are counted twice, evict() finds out
+            self._total += self._pending
+            self._saved.clear()
+            self._pending = 0
+            self._write_used()
+            if self._total > self.max_bytes:
+                self.evict()
+
+    def _write_used(self):
+        now = time.time()
+        self.db.executemany('UPDATE ed5 SET mtime = ?, used = ? '
+                            'WHERE path = ?',
+                            [(mtime, now, path)
+                             for path, mtime in self._used.items()])
+        self._used.clear()
+
+    def evict(self):
+        total = self.db.execute('SELECT TOTAL(LENGTH(data)) FROM ed5'
+                                ).fetchone()[0]
+        if total > self.max_bytes:
+            rows = self.db.execute('SELECT path, LENGTH(data) FROM ed5 '
+                                   'ORDER BY used').fetchall()
+            for path, size in rows:
+                if total <= self.max_bytes:
+                    break
+                self.db.execute('DELETE FROM ed5 WHERE path = ?', (path,))
+                total -= size
+        self._total = total
+
+    def close(self):
+        self.flush()
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def pack(self, ed5):
+        'serialize the decoded data of ed5, edit cells as columns'
+
+        state = ed5.__getstate__()
+        cells = state.pop('_edit_cells')
+        columns = []
+        for name in self.FIELDS:
+            values = [getattr(c, name) for c in cells]
+            if all(type(v) is int for v in values):
+                values = array.array('q', values)
+            elif all(v is None or type(v) is float for v in values):
+                values = array.array('d', [math.nan if v is None else v
+                                           for v in values])
+            columns.append(values)
+        return pickle.dumps((state, columns), pickle.HIGHEST_PROTOCOL)
+
+    def unpack(self, filename, data):
+        'return an ED5 from the data of pack()'
+
+        state, columns = pickle.loads(data)
+        for n, values in enumerate(columns):
+            if isinstance(values, array.array) and values.typecode == 'd':
+                columns[n] = [None if v != v else v for v in values]
+        ed5 = ED5.__new__(ED5)
+        ed5.__dict__.update(state)
+        ed5.filename = filename
+        with gc_paused():
+            ed5._edit_cells = [EditCell(*values) for values in zip(*columns)]
+        return ed5
+
+@contextlib.contextmanager
+def gc_paused():
+    'pause the garbage collector while creating lots of objects'
+
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+def file_hash(filename):
+    'return a hash of the content of filename'
+
+    h = hashlib.blake2b(digest_size=16)
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1024*1024), b''):
+            h.update(block)
+    return h.digest()
+
+# counters of all cookie index lookups, for profiling
+cookie_stats = {'hits': 0, 'misses': 0, 'scans': 0}
+
+_cookie_indexes = {}
+_cookie_lock = threading.Lock()
+
+def cookie_index(directory):
+    'return the shared CookieIndex of a project directory'
+
+    directory = os.path.abspath(directory)
+    index = _cookie_indexes.get(directory)
+    if index is None:
+        index = _cookie_indexes[directory] = CookieIndex(directory)
+    return index
+
+
+class CookieIndex:
+    """Listing of the cookie files in one project directory.
+
+       Replaces a glob per lookup by one os.scandir; the directory is
+       scanned again when its mtime changes."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.mtime = None
+        self.ed5 = {}
+        """map from last 4 chars of a cookie to cookies with an ed5 file"""
+        self.names = {}
+        """map from file name up to the first dot to file names"""
+
+    def refresh(self):
+        'scan the directory again if it changed since the last scan'
+
+        try:
+            mtime = os.stat(self.directory).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime is not None and mtime == self.mtime:
+            cookie_stats['hits'] += 1
+            profiling.count('cookie index hits')
+            return
+        # LW_ODB decodes in threads; a scan must not be seen half done,
+        # so the maps are filled first and mtime is set last
+        with _cookie_lock:
+            if mtime is not None and mtime == self.mtime:
+                return
+            cookie_stats['misses'] += 1
+            cookie_stats['scans'] += 1
+            profiling.count('cookie index misses')
+            profiling.count('directory scans')
+            ed5 = {}
+            names = {}
+            if mtime is not None:
+                with os.scandir(self.directory) as entries:
+                    for entry in entries:
+                        name = entry.name
+                        if name.startswith('.'):
+                            continue    # like glob, skip hidden files
+                        key = os.path.normcase(name)
+                        if key.endswith('.ed5') and len(key) >= 8:
+                            ed5.setdefault(key[-8:-4], []).append(name[:-4])
+                        prefix, dot, ext = key.partition('.')
+                        if dot:
+                            names.setdefault(prefix, []).append(name)
+            self.ed5 = ed5
+            self.names = names
+            self.mtime = mtime
+
+    def cookies(self, suffix):
+        'return all cookies "*<suffix>" with an ed5 file (like a glob)'
+
+        self.refresh()
+        return self.ed5.get(os.path.normcase(suffix), [])
+
+    def archive_files(self, cookie):
+        'return paths of the archived media "[SV]<cookie[1:]>.*"'
+
+        self.refresh()
+        rest = os.path.normcase(cookie[1:])
+        return [os.path.join(self.directory, name)
+                for prefix in (os.path.normcase('S'), os.path.normcase('V'))
+                for name in self.names.get(prefix + rest, [])]
+
+
+@contextlib.contextmanager
+def open_output(filename):
+    'open filename for writing text, "-" is stdout'
+
+    if filename == '-':
+        yield sys.stdout
+    else:
+        f = open(filename, 'w')
+        try:
+            yield f
+        finally:
+            f.close()
+
+def write_mlt(f, producers, tl):
+    """write MLT XML of a timeline.Timeline to the open file f;
+       producers are (reel, path) of its source clips"""
+
+    xml = xmlwriter.XMLWriter(f)
+    xml.declaration()
+    with xml.tag('mlt'):
+        for reel, path in producers:
+            with xml.tag('producer', id=reel):
+                with xml.tag('property', name='resource'):
+                    xml.text(path)
+
+        for channel, index in tl.playlists('V').items():
+            overlaps = [(a, b) for a, b in index.overlaps()
+                        if 'dissolve' not in (tl.cells[a].reel,
+                                              tl.cells[b].reel)]
+            if overlaps:
+                logging.warning('%d overlapping clips on %s' %
+                                (len(overlaps), channel))
+            with xml.tag('playlist', id=channel):
+                for i, blank in index.playlist():
+                    if blank:
+                        xml.stag('blank', length='%d' % blank)
+                    xml.stag('entry', **{
+                        'producer': tl.cells[i].reel,
+                        'in': "%d" % tl.src_in[i],
+                        'out': "%d" % tl.src_out[i]
+                        })
+
+def pair_cells(cells):
+    'merge each (in, out) pair of cells into the in cell, return these'
+
+    with profiling.stage('pair cells'):
+        ins = cells[0::2]
+        for c, out in zip(ins, cells[1::2]):
+            c.src_out = out.src_out
+            c.rec_out = out.rec_out
+    return ins
+
+def merge_cuts(cells):
+    """merge cells of the same cut on different tracks into one cell
+
+       Cells with equal reel, src_in, src_out, rec_in and rec_out are
+       folded into the first of them, whose track becomes a space
+       separated list of all their tracks.  Returns the new list."""
+
+    cuts = {}
+    merged = []
+    with profiling.stage('merge cuts'):
+        for c in cells:
+            key = (c.reel, c.src_in, c.src_out, c.rec_in, c.rec_out)
+            first = cuts.get(key)
+            if first is None:
+                cuts[key] = c
+                merged.append(c)
+            elif c.track not in first.track.split():
+                first.track += ' ' + c.track
+    return merged
+
+def read_segment(data, offset=0):
+    'read the (sub)segment header at offset; tail is a zero-copy view'
+    label, pos = read_cstring(data, offset)
+    flags = bytes(data[pos:pos+2])
+    a, b = struct.unpack_from('ii', data, pos+2)
     head_len = len(label) + 11
+    tail = memoryview(data)[offset+head_len:]
     return label, flags, a, b, head_len, tail
 
+def read_cstring(data, offset=0):
+    'return zero terminated string at offset and the offset behind it'
+    end = offset
+    while data[end]:
+        end += 1
+    return bytes(data[offset:end]), end + 1
+
 def t2hmsf(t, fps):
     "get string from seconds for EDL"
     
-    sec, frac = divmod(t,1)
-    ff=round(frac*fps)
-    t_str = time.strftime('%H:%M:%S', time.gmtime(sec))
-    t_str += ':%02d' % ff
-    return t_str
+    if fps > 0:
+        return timecode.formatter(fps).seconds(t)
+    # frame rate unknown (no project file)
+    return time.strftime('%H:%M:%S', time.gmtime(t // 1)) + ':00'
             
 def int2reel(num, directory):
     'find existing cookie for numeric ID'
     
     b36 = base36(num)
     b36 = '0' * (4 - len(b36)) + b36
-    p = os.path.join(directory, '*%s.ed5' % b36)
-    match = glob.glob(p)
+    profiling.count('reel lookups')
+    with profiling.stage('reel lookup'):
+        match = cookie_index(directory).cookies(b36)
     if len(match) != 1:
         logging.error('did not find uniq cookie "*%s" in %s' %
                       (b36, directory))
         return 'UNKNOWN'
     else:
-        return os.path.basename(match[0])[:-4]
+        return match[0]
 
     
 def base36(num):
@@ -645,12 +1278,6 @@ def isdebug():
     'return true if debugging is enabled' 
     return logging.getLogger().isEnabledFor(logging.DEBUG)
 
-def dprint(*args):
-    'print if debugging is enabled'
-
-    if isdebug():
-        print(*args)
-    
 def hexdump(data, offset=0, n=None):
 
     if len(data) < offset:
@@ -668,12 +1295,91 @@ def hexdump(data, offset=0, n=None):
         print('%04x  %s %s' % (offset, str2.ljust(50), str3.encode('utf8')))
         offset += 16
     
+def expand_inputs(names):
+    'expand directories (to their *.ed5 files) and glob patterns'
+
+    files = []
+    for name in names:
+        if os.path.isdir(name):
+            files.extend(sorted(glob.glob(os.path.join(glob.escape(name),
+                                                       '*.ed5'))))
+        elif any(ch in name for ch in '*?['):
+            match = sorted(glob.glob(name))
+            if not match:
+                logging.error('no files match %s' % name)
+            files.extend(match)
+        else:
+            files.append(name)
+    return files
+
+def output_path(template, filename):
+    'fill {dir}, {name} and {stem} of filename into an output path'
+
+    if template in (None, '-'):
+        return template
+    name = os.path.basename(filename)
+    return template.format(dir=os.path.dirname(os.path.abspath(filename)),
+                           name=name, stem=os.path.splitext(name)[0])
+
+def convert(filename, edl_file=None, mlt_file=None, fcpxml_file=None,
+            clipnames=False, gvg_edl=False):
+    """decode one ed5 file and export it; returns (filename, seconds, error)
+
+       Every export works on its own copy of the edit cells, as they get
+       rewritten during export."""
+
+    start = time.perf_counter()
+    try:
+        with profiling.for_file(filename), profiling.stage('convert'):
+            if isdebug():
+                # decode and dump every subsegment, not only what the
+                # exports need
+                ed5 = ED5(filename, debug=True)
+            else:
+                ed5 = ed5_cache.get(filename)
+            cells = ed5.edit_cells
+            try:
+                if edl_file:
+                    ed5.edit_cells = [c.copy() for c in cells]
+                    ed5.edl(output_path(edl_file, filename), clipnames,
+                            gvg_edl)
+                if mlt_file:
+                    ed5.edit_cells = [c.copy() for c in cells]
+                    ed5.mlt(output_path(mlt_file, filename))
+                if fcpxml_file:
+                    ed5.edit_cells = [c.copy() for c in cells]
+                    ed5.fcpxml(output_path(fcpxml_file, filename))
+            finally:
+                ed5.edit_cells = cells
+    except (Exception, SystemExit) as e:
+        logging.error('%s: %s' % (filename, e or type(e).__name__))
+        return filename, time.perf_counter() - start, str(e) or 'failed'
+    return filename, time.perf_counter() - start, None
+
+def _init_worker(indexes, debug, cache, profile=False):
+    'set up a batch worker process with the cookie indexes of the parent'
+
+    if debug:
+        logging.basicConfig(level=logging.DEBUG)
+    _cookie_indexes.update(indexes)
+    if cache:
+        ed5_cache.store = ED5Store(cache)
+    profiling.enable(profile)
+
+def _convert_job(job):
+    # the figures of the job go back with its result
+    result = convert(*job)
+    if ed5_cache.store:
+        ed5_cache.store.flush()
+    return result, profiling.take()
+
 def main():
     parser = argparse.ArgumentParser(description='analyze .ed5 files')
     parser.add_argument('--version', action='version',
                          version='%(prog)s: ' + VERSION)
     parser.add_argument('-d', '--debug', action='store_true' )
-    parser.add_argument('files', metavar='FILE', nargs='+' )
+    parser.add_argument('files', metavar='FILE', nargs='+',
+                        help='ed5 file, directory of ed5 files or glob')
 
     parser.add_argument('-m', '--mlt', metavar='FILE',
                         help='export as MLT XML (use "-" for stdout)')
@@ -681,30 +1387,81 @@ def main():
                         help='export as EDL (use "-" for stdout)')
     parser.add_argument('-x', '--fcpxml', metavar='FILE',
                         help='export as Final Cut XML (use "-" for stdout)')
+    parser.add_argument('-j', '--jobs', type=int, default=1, metavar='N',
+                        help='convert N files in parallel')
+    parser.add_argument('--cache', metavar='FILE',
+                        help='keep decoded ed5 files in this sqlite file '
+                        'and reuse them while they are unchanged')
 
     parser.add_argument('-c', '--clipnames', action='store_true',
                         help='use clipname as reel in EDL')
     parser.add_argument('-g', '--gvg-edl', action='store_true',
                         help='grass valley group EDL format')
+    parser.add_argument('--profile', metavar='FILE', nargs='?', const='-',
+                        help='report time and counters per stage and file '
+                        '(to stderr, or FILE; JSON if FILE ends in .json)')
+    parser.epilog = ('With several input files the export FILE names are '
+                     'templates: {dir}, {name} and {stem} are replaced by '
+                     'the directory, file name and file name without '
+                     'extension of each input (e.g. -e "{dir}/{stem}.edl").')
 
     args = parser. parse_args()
     #print('ARGS:', args)
     if args.debug:
         logging.basicConfig(level=logging.DEBUG)
+    if args.cache:
+        ed5_cache.store = ED5Store(args.cache)
+    if args.profile:
+        profiling.enable()
 
 ##    if args.edl and args.mlt and args.fcpxml:
 ##        logging.error('you can use only one export format')
 ##        sys.exit(0)
     
-    for f in args.files:
-        ed5 = ED5(f)
-
-        if args.edl:
-            ed5.edl(args.edl, args.clipnames, args.gvg_edl)
-        if args.mlt:
-            ed5.mlt(args.mlt)
-        if args.fcpxml:
-            ed5.fcpxml(args.fcpxml)
+    files = expand_inputs(args.files)
+    outputs = [args.edl, args.mlt, args.fcpxml]
+    for out in outputs:
+        if out and out != '-' and \
+           len(set(output_path(out, f) for f in files)) < len(files):
+            parser.error('output "%s" would be overwritten by several '
+                         'inputs, use {stem} in its name' % out)
+    if args.jobs > 1 and '-' in outputs:
+        parser.error('can not write to stdout with more than one job')
+
+    jobs = [(f, args.edl, args.mlt, args.fcpxml, args.clipnames,
+             args.gvg_edl) for f in files]
+    if args.jobs > 1:
+        # one shared cookie index per project directory for all workers
+        indexes = {}
+        for d in set(os.path.dirname(os.path.abspath(f)) for f in files):
+            index = cookie_index(d)
+            index.refresh()
+            indexes[index.directory] = index
+        with concurrent.futures.ProcessPoolExecutor(
+                args.jobs, initializer=_init_worker,
+                initargs=(indexes, args.debug, args.cache,
+                          bool(args.profile))) as pool:
+            results = []
+            for result, figures in pool.map(_convert_job, jobs):
+                results.append(result)
+                profiling.merge(figures)
+    else:
+        results = [convert(*job) for job in jobs]
+
+    if len(files) > 1:
+        total = 0
+        for f, seconds, error in results:
+            total += seconds
+            sys.stderr.write('%8.3fs  %-6s %s\n' % (seconds,
+                                                    error and 'FAILED' or 'ok',
+                                                    f))
+        sys.stderr.write('%8.3fs  total (%d files)\n' % (total, len(files)))
+    if ed5_cache.store:
+        ed5_cache.store.close()
+    if args.profile:
+        profiling.dump(args.profile)
+    if any(error for f, seconds, error in results):
+        sys.exit(1)
     
 if __name__ == '__main__':
     main()
@@ -75,7 +75,8 @@ class EDL(list):
         # auto-detect dialect: Premiere, Final Cut, Sony, CMX, etc.
         pass
 
-    def savePremiere(self):
+    def savePremiere(self, f=None):
+        "write as CMX 3600 style EDL to the open file f (default stdout)"
         # CMX 3600:
         #   111^^222^^3333^^4444^555^666666666666^777777777777^888888888888^999999999999^
         # Old Lightworks converter:
@@ -86,19 +87,19 @@ class EDL(list):
         #   * FROM CLIP NAME: Ep6_Sc2 - Elliot tries again with Tiff.mp4
 
         if not not self.title:
-            print("TITLE: ", self.title)
+            print("TITLE: ", self.title, file=f)
         if self.dropframe:
-            print("FCM: DROP FRAME")
+            print("FCM: DROP FRAME", file=f)
         else:
-            print("FCM: NON DROP FRAME")
-        print()
+            print("FCM: NON DROP FRAME", file=f)
+        print(file=f)
         
         for block in self:
             s = "%03d  %-8s  %-4s  %-4s %03s %-11s %-11s %-11s %-11s" \
                 % (block.id, block.reel, block.channels,
-                   block.transition, block.transDur,
+                   block.transition, block.transDur or "",
                    block.srcIn, block.srcOut, block.recIn, block.recOut)
-            print(s)
+            print(s, file=f)
 
 
 # TITLE: title
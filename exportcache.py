@@ -0,0 +1,175 @@
+#!/usr/bin/python3
+
+"""
+exportcache.py -- Remember exported items between runs.
+
+Copyright (C) 2015 William R. Zwicky <wrzwicky@pobox.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import json, logging, os
+import ed5decode
+import profiling
+
+
+class ExportCache:
+    """Output of each project item from an earlier export, with the
+       fingerprint of its inputs: the odb row and size, mtime and content
+       hash of the ed5 file.
+
+       An item is unchanged while its row and file still match.  Edits
+       also list the cookies of the reels they use (deps); an edit must
+       be exported again when one of them changed too.  Everything is
+       thrown away when the project metadata differs from the last run.
+
+       Usage:
+           cache = ExportCache('out.xml.cache', odb.metadata)
+           data = cache.get(item, 'xmeml')
+           if data is None:
+               data = ...
+               cache.put(item, 'xmeml', data, deps)
+           cache.save()"""
+
+    VERSION = 5
+    """bump when the stored output format changes"""
+
+    def __init__(self, filename, context=None):
+        self.filename = filename
+        self.context = context
+        """anything json can store; entries are only kept if it is equal"""
+        self.entries = {}
+        """map from cookie to dict of row, size, mtime, hash, deps, out"""
+        self.checked = {}
+        """map from cookie to entry (or None if changed), this run"""
+        self.written = {}
+        """map from cookie to entry, for the entries made this run"""
+        self.dirty = False
+        """True if entries changed since load"""
+        self.hits = 0
+        self.misses = 0
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.filename) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logging.error('ignoring export cache %s: %s' % (self.filename, e))
+            return
+        if data.get('version') == self.VERSION and \
+           data.get('context') == self.context:
+            self.entries = data['entries']
+
+    def new_run(self):
+        """Start another export with the same cache, e.g. in a watcher:
+           every item is checked again."""
+        self.checked = {}
+        self.written = {}
+
+    def save(self):
+        if not self.dirty:
+            return
+        # json.dumps is a lot faster than json.dump, it runs in C
+        data = json.dumps({'version': self.VERSION, 'context': self.context,
+                           'entries': self.entries})
+        # write a new file first, a crash must not leave half a cache
+        tmp = '%s.%d.tmp' % (self.filename, os.getpid())
+        with open(tmp, 'w') as f:
+            f.write(data)
+        os.replace(tmp, self.filename)
+        self.dirty = False
+
+    def fingerprint(self, item):
+        'return [row, size, mtime_ns] of an LW_ODB item'
+
+        row = {k: v for k, v in item.items() if not k.startswith('.')}
+        try:
+            st = os.stat(item.filename)
+        except OSError:
+            return [row, None, None]
+        return [row, st.st_size, st.st_mtime_ns]
+
+    def unchanged(self, item):
+        'True if the inputs of item are the same as in the cached entry'
+
+        cookie = item.cookie
+        if cookie not in self.checked:
+            self.checked[cookie] = self._check(item)
+        return self.checked[cookie] is not None
+
+    def _check(self, item):
+        row, size, mtime = self.fingerprint(item)
+        entry = self.entries.get(item.cookie)
+        if entry is None or size is None or \
+           entry['row'] != row or entry['size'] != size:
+            return None
+        if entry['mtime'] != mtime:
+            # touched, maybe not changed
+            if entry['hash'] != ed5decode.file_hash(item.filename).hex():
+                return None
+            entry['mtime'] = mtime
+            self.dirty = True
+        return entry
+
+    def deps(self, item):
+        'return the reels of item from the cache, or None if unknown'
+
+        if not self.unchanged(item):
+            return None
+        return self.entries[item.cookie]['deps']
+
+    def get(self, item, fmt, items=None):
+        """Return the cached output of item in format fmt, or None if it
+           has to be exported again.  items maps cookies to LW_ODB items;
+           it is needed to check the reels an edit depends on."""
+
+        data = None
+        if self.unchanged(item):
+            entry = self.entries[item.cookie]
+            data = entry['out'].get(fmt)
+            for dep in entry['deps']:
+                if items is None or dep not in items or \
+                   not self.unchanged(items[dep]):
+                    data = None
+                    break
+        if data is None:
+            self.misses += 1
+            profiling.count('export cache misses')
+        else:
+            self.hits += 1
+            profiling.count('export cache hits')
+        return data
+
+    def put(self, item, fmt, data, deps=()):
+        'store output data of item in format fmt'
+
+        entry = self.written.get(item.cookie)
+        if entry is None:
+            # a new entry drops the other formats, they may be stale
+            row, size, mtime = self.fingerprint(item)
+            try:
+                h = ed5decode.file_hash(item.filename).hex()
+            except OSError:
+                h = None
+            entry = {'row': row, 'size': size, 'mtime': mtime, 'hash': h,
+                     'deps': sorted(deps), 'out': {}}
+            self.entries[item.cookie] = self.written[item.cookie] = entry
+            # the dependency check of other edits in this run must still
+            # see this item as changed
+            self.checked.setdefault(item.cookie, None)
+        entry['out'][fmt] = data
+        self.dirty = True
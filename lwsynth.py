@@ -0,0 +1,202 @@
+#!/usr/bin/python3
+
+"""
+lwsynth.py -- Write synthetic Lightworks projects for tests and benchmarks.
+
+Copyright (C) 2015 William R. Zwicky <wrzwicky@pobox.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import argparse, os, random, struct
+import ed5decode
+
+# Every (sub)segment starts with a zero terminated label, two flag bytes
+# and two ints: a is the length of a subsegment's data (of a segment's
+# index), b the length of a segment's index plus its subsegments.
+HEADER = struct.Struct('<2xii')
+
+ENVELOPE_POINT = struct.Struct('<d3xI6x')
+"""time and gain of one point of an A subsegment"""
+GAIN_0DB = 0xf0000000
+GAIN_PER_DB = 10240000
+"""gain as ed5decode.int2db reads it"""
+
+REEL_BLACK = 1
+REEL_DISSOLVE = 0xb655
+FIRST_REEL = 100
+"""reel number of the first shot; cookies end in the reel in base 36"""
+
+
+def subsegment(label, data):
+    return label + b'\0' + HEADER.pack(len(data), 0) + data
+
+def segment(subsegments):
+    body = b''.join(subsegments)
+    index = b'idx\0'
+    return b'$\0' + HEADER.pack(len(index), len(index) + len(body)) + \
+           index + body
+
+def t_subsegment(text):
+    return subsegment(b'T', b'\x01' + text.encode() + b'\0')
+
+def ehp_subsegment(values):
+    parts = b''.join(k.encode() + b'\0' + v.encode() + b'\0text\0'
+                     for k, v in values.items())
+    return subsegment(b'EHP', b'\0\0' + struct.pack('<i', len(values)) +
+                      parts)
+
+def a_subsegment(points):
+    'A subsegment (audio envelope) of (seconds, gain in dB) points'
+    return subsegment(b'A', struct.pack('<i', len(points)) + b''.join(
+        ENVELOPE_POINT.pack(t, GAIN_0DB + round(db * GAIN_PER_DB))
+        for t, db in points))
+
+def c_subsegment(track, records=None):
+    """C subsegment of a track; records are (rec, src, reel, scope, sel,
+       id1, id2) tuples as in ed5decode.EDIT_RECORD.  Without records
+       it is the C subsegment of a shot, which has no edit cells."""
+    head = b'\x02ref\0' + track.encode() + b'\0sub\0\0'
+    if records is None:
+        return subsegment(b'C', head + struct.pack('<dI', 0.04, 3) +
+                          struct.pack('<II', 3, 0xf0000000) + b'\0' * 9)
+    data = b''.join(ed5decode.EDIT_RECORD.pack(0.0, 1.0, *r)
+                    for r in records)
+    return subsegment(b'C', head +
+                      struct.pack('<dI', 0.04, len(records)) +
+                      struct.pack('<II', len(records), 0) + b'\0' * 9 +
+                      data)
+
+
+def cookie(prefix, reel):
+    return '%s%s' % (prefix, ed5decode.base36(reel).rjust(4, '0'))
+
+def track_records(rng, cuts, shots, video, dissolves=0):
+    'return the edit records of one track, with dissolves spread evenly'
+    dissolves = min(dissolves, cuts - 1) if video else 0
+    before = {(j + 1) * cuts // (dissolves + 1) for j in range(dissolves)}
+    records = []
+    t = 0.0
+    for k in range(cuts):
+        d = rng.choice([1.0, 2.0, 2.5, 3.2])
+        reel = FIRST_REEL + rng.randrange(shots)
+        if k % 7 == 3:
+            reel = REEL_BLACK
+        if k in before:
+            records.append((t, 0.0, REEL_DISSOLVE, b'V', 1, k, k))
+            records.append((t + 1, 1.0, REEL_DISSOLVE, b'V', 4, k, k))
+        s = rng.choice([0.0, 10.0, 3.0]) if video else 0.0
+        records.append((t, s, reel, b'V', 1, k, k))
+        records.append((t + d, s + d, reel, b'V', 4, k, k))
+        t += d
+    return records
+
+def envelope(rng, records):
+    'return (seconds, dB) points of a fade in and a level for each cut'
+    points = []
+    for rec, src, reel, scope, sel, id1, id2 in records:
+        if sel == 1 and reel != REEL_BLACK:
+            level = rng.choice([0.0, -3.0, -6.0, -12.0])
+            points += [(rec, -60.0), (rec + 0.5, level)]
+    return points
+
+
+def write_project(directory, shots=20, cuts=50, tracks=('V1', 'A1', 'A2'),
+                  edits=1, dissolves=None, fps=25, seed=1):
+    """Write a project with an odb table and one ed5 file per shot and
+       edit into directory, and return the path of the odb file.
+
+       Each edit has cuts in/out cell pairs per track, of random shots,
+       with every 7th cut black.  A first video track gets dissolves
+       (default: one per 9 cuts) spread over it; A1 follows the cuts of
+       V1 (linked audio), other tracks are cut on their own.  Audio
+       tracks have an envelope (A subsegment) with a fade in at each cut.
+       The same seed gives the same files."""
+
+    rng = random.Random(seed)
+    if dissolves is None:
+        dissolves = cuts // 9
+    os.makedirs(directory, exist_ok=True)
+    shot_cookies = [cookie('S000', FIRST_REEL + i) for i in range(shots)]
+    edit_cookies = [cookie('E000', FIRST_REEL + shots + i)
+                    for i in range(edits)]
+
+    odb = os.path.join(directory, 'O0000PRJ.odb')
+    with open(odb, 'w', newline='\r\n') as f:
+        f.write('"OLEDB:Rev 1"\n"PROJDB_VERSION:V1.16"\n'
+                '"PROJECT_NAME:Synthetic %d"\n"PROJECT_RATE:%d"\n'
+                '"PROJECT_PSWD:"\n"OLEDB"\n' % (seed, fps))
+        f.write('"8","8","6","12"\n"text","text","int","dos_date"\n'
+                '"Cookie","Type","Flags","Date"\n')
+        for c in shot_cookies:
+            f.write('"%s","shot","1","1400000000"\n' % c)
+        for c in edit_cookies:
+            f.write('"%s","edit","2","1400000000"\n' % c)
+
+    for n, c in enumerate(shot_cookies):
+        with open(os.path.join(directory, c + '.ed5'), 'wb') as f:
+            f.write(segment([
+                t_subsegment(c),
+                ehp_subsegment({'ORIGINAL_FILE_0': '/media/clip%d.mov' % n,
+                                'PROJECT_COOKIE': 'P0000PRJ'}),
+                c_subsegment('V1')]))
+
+    for n, c in enumerate(edit_cookies):
+        segments = [segment([
+            t_subsegment(c),
+            # ED5.edl_lines drops the first three words of the name
+            ehp_subsegment({'name': '0 0 0 Edit %d' % (n + 1),
+                            'PROJECT_COOKIE': 'P0000PRJ'})])]
+        linked = None
+        for i, track in enumerate(tracks):
+            if track == 'A1' and linked is not None:
+                records = linked
+            else:
+                records = track_records(rng, cuts, shots, track[0] == 'V',
+                                        dissolves if i == 0 else 0)
+            if track == 'V1':
+                linked = [r for r in records if r[2] != REEL_DISSOLVE]
+            subsegments = [t_subsegment('trk')]
+            if track[0] == 'A':
+                subsegments.append(a_subsegment(envelope(rng, records)))
+            subsegments.append(c_subsegment(track, records))
+            segments.append(segment(subsegments))
+        with open(os.path.join(directory, c + '.ed5'), 'wb') as f:
+            f.write(b''.join(segments))
+
+    return odb
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='write a synthetic Lightworks project')
+    parser.add_argument('directory')
+    parser.add_argument('--shots', type=int, default=20)
+    parser.add_argument('--cuts', type=int, default=50,
+                        help='cuts per track of each edit')
+    parser.add_argument('--tracks', default='V1,A1,A2',
+                        help='comma separated track names')
+    parser.add_argument('--edits', type=int, default=1)
+    parser.add_argument('--dissolves', type=int, metavar='N',
+                        help='dissolves on the first track of each edit, '
+                        'if it is video (default: one per 9 cuts)')
+    parser.add_argument('--fps', type=int, default=25)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    print(write_project(args.directory, args.shots, args.cuts,
+                        args.tracks.split(','), args.edits,
+                        args.dissolves, args.fps, args.seed))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,329 @@
+#!/usr/bin/python3
+
+"""
+lwwatch.py -- Export Lightworks projects again whenever they are saved.
+
+Copyright (C) 2015 William R. Zwicky <wrzwicky@pobox.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import argparse, ctypes, ctypes.util, logging, os, re, select, struct, sys
+import time
+import ed5decode
+import exportcache
+import LW_ODB
+import odbfile
+
+BACKUP = re.compile(r'\.U\d+$', re.IGNORECASE)
+"""Lightworks keeps older versions of a file as <name>.U<number>"""
+
+def relevant(name):
+    'True for the project files an export depends on'
+    if BACKUP.search(name):
+        return False
+    name = os.path.normcase(name)
+    return name.endswith('.ed5') or name.endswith('.odb')
+
+
+class InotifyWatcher:
+    """Changes in directories, from the Linux inotify API (via ctypes).
+
+       Usage:
+           w = InotifyWatcher()
+           w.watch('/path/to/project')
+           for directory, name in w.changes(timeout=1.0):
+               ..."""
+
+    # from <sys/inotify.h>
+    IN_MODIFY = 0x002
+    IN_ATTRIB = 0x004
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_Q_OVERFLOW = 0x4000
+    MASK = (IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_CREATE |
+            IN_DELETE | IN_ATTRIB)
+    EVENT = struct.Struct('iIII')
+    """wd, mask, cookie, length of the name that follows"""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.libc = libc
+        # raises AttributeError where there is no inotify
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.dirs = {}
+        """map from watch descriptor to directory"""
+
+    def watch(self, directory):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory),
+                                         self.MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), directory)
+        self.dirs[wd] = directory
+
+    def changes(self, timeout):
+        """Return the set of (directory, name) changed, waiting up to
+           timeout seconds for the first.  A name of None means anything
+           in directory may have changed."""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return set()
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = self.EVENT.unpack_from(data,
+                                                                  offset)
+                offset += self.EVENT.size
+                name = data[offset:offset+length].rstrip(b'\0')
+                offset += length
+                if mask & self.IN_Q_OVERFLOW:
+                    # events were lost
+                    changed.update((d, None) for d in self.dirs.values())
+                elif wd in self.dirs:
+                    changed.add((self.dirs[wd], os.fsdecode(name)))
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Changes in directories, by comparing the size and mtime of their
+       project files every interval seconds.  Works everywhere."""
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self.dirs = {}
+        """map from directory to {name: (mtime, size)}"""
+
+    def scan(self, directory):
+        files = {}
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if relevant(entry.name):
+                        st = entry.stat()
+                        files[entry.name] = (st.st_mtime_ns, st.st_size)
+        except OSError as e:
+            logging.error('can not scan %s: %s' % (directory, e))
+        return files
+
+    def watch(self, directory):
+        self.dirs[directory] = self.scan(directory)
+
+    def changes(self, timeout):
+        'like InotifyWatcher.changes'
+        end = time.monotonic() + (timeout if timeout is not None else 1e9)
+        while True:
+            changed = set()
+            for directory, old in self.dirs.items():
+                new = self.dirs[directory] = self.scan(directory)
+                changed.update((directory, name)
+                               for name in old.keys() | new.keys()
+                               if old.get(name) != new.get(name))
+            left = end - time.monotonic()
+            if changed or left <= 0:
+                return changed
+            time.sleep(min(self.interval, left))
+
+    def close(self):
+        pass
+
+
+def watcher(poll=None):
+    'return an InotifyWatcher, or a PollingWatcher if there is no inotify'
+    if poll is None:
+        try:
+            return InotifyWatcher()
+        except (OSError, AttributeError, TypeError):
+            # TypeError: find_library() found no C library
+            pass
+        poll = 1.0
+    return PollingWatcher(poll)
+
+
+class Project:
+    """One watched project.  The decoded ed5 files stay in
+       ed5decode.ed5_cache and the output of each item in an ExportCache,
+       so an export only decodes the files that changed."""
+
+    RETRY = 1.0
+    RETRY_MAX = 60.0
+    """seconds before a failed export is tried again, doubled after each
+       failure up to RETRY_MAX"""
+
+    def __init__(self, odb_file, formats, template):
+        self.odb_file = odb_file
+        self.directory = os.path.dirname(os.path.abspath(odb_file))
+        self.formats = formats
+        self.template = template
+        self.cache = None
+        self.changed = None
+        """time.monotonic() of the first change not exported yet"""
+        self.failures = 0
+        """exports that failed in a row"""
+        self.retry = None
+        """time.monotonic() to try a failed export again"""
+
+    def due(self, last, quiet, latency):
+        'return time.monotonic() of the next export, None to wait for changes'
+        if self.changed is not None:
+            return min(last + quiet, self.changed + latency,
+                       self.retry or float('inf'))
+        return self.retry
+
+    def export(self):
+        'export now, return the files written'
+        self.changed = None
+        self.retry = None
+        try:
+            metadata = odbfile.load(self.odb_file).metadata
+            if self.cache is None or self.cache.context != metadata:
+                # new project settings make all output stale
+                self.cache = exportcache.ExportCache(
+                    LW_ODB.output_path(self.template, self.odb_file, 'cache'),
+                    metadata)
+            written = LW_ODB.export_project(self.odb_file, self.formats,
+                                            self.template, cache=self.cache)
+        except Exception:
+            self.failures += 1
+            # without the odb file wait until it is saved again
+            if os.path.exists(self.odb_file):
+                self.retry = time.monotonic() + min(
+                    self.RETRY_MAX, self.RETRY * 2 ** (self.failures - 1))
+            raise
+        self.failures = 0
+        return written
+
+
+def run(projects, watch, quiet=0.5, latency=2.0):
+    """Export projects, then again after each change, until interrupted.
+
+       A burst of saves is exported once: the export starts when no file
+       changed for quiet seconds, but no later than latency seconds after
+       the first change.  A failed export is tried again after a while,
+       or after the next change if the odb file is gone."""
+
+    by_dir = {}
+    for p in projects:
+        if p.directory not in by_dir:
+            watch.watch(p.directory)
+        by_dir.setdefault(p.directory, []).append(p)
+        export(p)
+
+    last = None
+    while True:
+        now = time.monotonic()
+        due = [d for d in (p.due(last, quiet, latency) for p in projects)
+               if d is not None]
+        if due:
+            timeout = max(0, min(due) - now)
+        else:
+            timeout = None
+        changes = watch.changes(timeout)
+
+        now = time.monotonic()
+        for directory, name in changes:
+            if name is not None and not relevant(name):
+                continue
+            last = now
+            for p in by_dir.get(directory, []):
+                if p.changed is None:
+                    p.changed = now
+        for p in projects:
+            d = p.due(last, quiet, latency)
+            if d is not None and now >= d:
+                export(p)
+
+def export(project):
+    'export a project and report it on stderr'
+    start = time.perf_counter()
+    changed = project.changed
+    try:
+        written = project.export()
+    except Exception as e:
+        logging.error('%s: %s' % (project.odb_file, e or type(e).__name__))
+        return
+    now = time.perf_counter()
+    delay = ''
+    if changed is not None:
+        delay = ' (%.3fs after the first change)' % (time.monotonic() -
+                                                       changed)
+    sys.stderr.write('%s  %8.3fs  %d files  %s%s\n' % (
+        time.strftime('%H:%M:%S'), now - start, len(written),
+        project.odb_file, delay))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='export Lightworks projects whenever they change')
+    parser.add_argument('inputs', metavar='PROJECT', nargs='+',
+                        help='project odb file or archive directory')
+    parser.add_argument('-f', '--format', action='append',
+                        choices=sorted(LW_ODB.FORMATS),
+                        help='export format, may be given more than once '
+                        '(default: xmeml)')
+    parser.add_argument('-o', '--output', metavar='TEMPLATE',
+                        default='{dir}/{stem}{edit}.{ext}',
+                        help='output files, as for LW_ODB.py '
+                        '(default: %(default)s)')
+    parser.add_argument('--quiet', type=float, default=0.5, metavar='SEC',
+                        help='export once no file changed for SEC seconds '
+                        '(default: %(default)s)')
+    parser.add_argument('--latency', type=float, default=2.0, metavar='SEC',
+                        help='but at most SEC seconds after the first '
+                        'change (default: %(default)s)')
+    parser.add_argument('--poll', type=float, metavar='SEC',
+                        help='look for changes every SEC seconds instead '
+                        'of using inotify')
+    parser.add_argument('-d', '--debug', action='store_true')
+    args = parser.parse_args()
+    if args.debug:
+        logging.basicConfig(level=logging.DEBUG)
+
+    formats = args.format or ['xmeml']
+    if LW_ODB.overwrites_edits(args.output, formats):
+        parser.error('output "%s" would be overwritten by each edit, '
+                     'use {edit} in it' % args.output)
+    projects = [Project(f, formats, args.output)
+                for path in args.inputs
+                for f in LW_ODB.project_files(path)]
+    if not projects:
+        parser.error('no projects found')
+    # keep every decoded ed5 file of the projects in memory
+    ed5decode.ed5_cache.max_entries = 1 << 30
+    ed5decode.ed5_cache.max_bytes = 1 << 40
+
+    watch = watcher(args.poll)
+    sys.stderr.write('watching %d projects (%s)\n' % (
+        len(projects), type(watch).__name__))
+    try:
+        run(projects, watch, args.quiet, args.latency)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watch.close()
+
+if __name__ == '__main__':
+    main()
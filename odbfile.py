@@ -0,0 +1,170 @@
+#!/usr/bin/python3
+
+"""
+odbfile.py -- Read Lightworks project databases (*.odb) into typed columns.
+
+Copyright (C) 2015 William R. Zwicky <wrzwicky@pobox.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import array, csv, logging, os, sys
+import timecode
+
+
+class ODBFile:
+    """The metadata and table of one odb file.
+
+       The file is CSV text: "KEY:value" metadata lines, then rows with
+       the width, type and name of each field, then one row per clip or
+       edit.  The rows are kept as lists of interned strings, as most
+       values repeat ('shot', '1', ...).  column() makes a column of a
+       field on first use, converted by field type: int and dos_date
+       (seconds since epoch) to arrays of ints, timecode to arrays of
+       frame numbers at PROJECT_RATE.  A column stays text if any value
+       does not convert.
+
+       Usage:
+           db = odbfile.load('O0000PRJ.odb')
+           db.title, db.fps, db.get('E0000EDT', 'Date')"""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.metadata = {}
+        """dict of misc values in the odb file"""
+        self.flens = []
+        """list of field lengths"""
+        self.ftypes = []
+        """list of field types"""
+        self.fnames = []
+        """list of field names"""
+        self.fnum = {}
+        """map from field name to field index"""
+        self.table = []
+        """list of rows, each a tuple of strings"""
+        self.columns = {}
+        """map from field name to converted values, see column()"""
+        self.cookies = {}
+        """map from cookie (first field) to row number"""
+        self.load()
+
+    @property
+    def title(self):
+        return self.metadata.get('PROJECT_NAME')
+
+    @property
+    def fps(self):
+        "frames per second, 0 if unknown"
+        try:
+            return int(self.metadata.get('PROJECT_RATE', 0))
+        except ValueError:
+            return 0
+
+    def load(self):
+        rows = self.table
+        intern = sys.intern
+        tablerow = 0
+        with open(self.filename, newline='') as csvfile:
+            for row in csv.reader(csvfile, delimiter=',', quotechar='"',
+                                  skipinitialspace=True):
+                if not row:
+                    continue
+                if len(row) == 1:
+                    [k,s,v] = row[0].partition(':')
+                    if not not v:
+                        self.metadata[k] = v
+                    continue
+                tablerow += 1
+                if tablerow == 1:
+                    self.flens = row
+                elif tablerow == 2:
+                    self.ftypes = row
+                elif tablerow == 3:
+                    self.fnames = row
+                    self.fnum = dict(zip(row, range(0,len(row))))
+                else:
+                    rows.append(tuple(map(intern, row)))
+
+        width = len(self.fnames)
+        for n, row in enumerate(rows):
+            if len(row) != width:
+                logging.error('odb row %d has %d fields, not %d: %s' %
+                              (n + 1, len(row), width, self.filename))
+                rows[n] = (row + ('',) * width)[:width]
+        self.cookies = {row[0]: n for n, row in enumerate(rows)}
+
+    def column(self, name):
+        'return the values of field name, converted by field type'
+        if name not in self.columns:
+            i = self.fnum[name]
+            values = [row[i] for row in self.table]
+            ftype = self.ftypes[i] if i < len(self.ftypes) else ''
+            if ftype in ('int', 'dos_date'):
+                convert = int
+            elif ftype == 'timecode' and self.fps > 0:
+                convert = timecode.formatter(self.fps).parse
+            else:
+                convert = None
+            if convert is not None:
+                try:
+                    values = array.array('q', map(convert, values))
+                except ValueError:
+                    logging.warning('odb field %s is not all %s' %
+                                    (name, ftype))
+            self.columns[name] = values
+        return self.columns[name]
+
+    def __len__(self):
+        return len(self.cookies)
+
+    def __contains__(self, cookie):
+        return cookie in self.cookies
+
+    def row(self, cookie, typed=True):
+        'return dict of field name to value for the row of cookie'
+        n = self.cookies[cookie]
+        if not typed:
+            return dict(zip(self.fnames, self.table[n]))
+        return {name: self.column(name)[n] for name in self.fnames}
+
+    def rows(self, typed=True):
+        'generate a dict for each row, in file order'
+        fnames = self.fnames
+        if typed:
+            table = zip(*[self.column(name) for name in fnames])
+        else:
+            table = self.table
+        for values in table:
+            yield dict(zip(fnames, values))
+
+    def get(self, cookie, field, default=None):
+        'return the converted value of field in the row of cookie'
+        n = self.cookies.get(cookie)
+        if n is None or field not in self.fnum:
+            return default
+        return self.column(field)[n]
+
+
+_files = {}
+
+def load(filename):
+    """Return the ODBFile of filename.  It is parsed once and shared
+       until the file changes."""
+    path = os.path.abspath(filename)
+    st = os.stat(path)
+    key = (st.st_mtime_ns, st.st_size)
+    entry = _files.get(path)
+    if entry is None or entry[0] != key:
+        entry = _files[path] = (key, ODBFile(path))
+    return entry[1]
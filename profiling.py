@@ -0,0 +1,196 @@
+#!/usr/bin/python3
+
+"""
+profiling.py -- Opt-in timers and counters per stage and per file.
+
+Copyright (C) 2015 William R. Zwicky <wrzwicky@pobox.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Usage:
+    profiling.enable()
+    with profiling.for_file('E0000EDT.ed5'):
+        with profiling.stage('decode'):
+            ...
+        profiling.count('records', 1000)
+    profiling.dump('-')
+
+While disabled (the default) stage() and count() do nothing, so they
+can stay in the code.  Stages may nest; each one is timed on its own,
+so nested stages are also part of the time of the outer one.
+"""
+
+import contextlib, json, sys, time
+
+enabled = False
+"""True while timers and counters are recorded"""
+
+TOTAL = '(total)'
+NO_FILE = '(other)'
+
+_file = NO_FILE
+_stages = {}
+"""map from (file, stage) to [seconds, calls]"""
+_counters = {}
+"""map from (file, counter) to value"""
+
+RATES = [
+    # name, counter, stage it is divided by
+    ('records/s', 'records', 'edit records'),
+    ('bytes/s', 'bytes decoded', 'edit records'),
+]
+"""throughput figures computed for the report"""
+
+
+def enable(on=True):
+    global enabled
+    enabled = on
+
+def reset():
+    _stages.clear()
+    _counters.clear()
+
+
+class _Timer:
+
+    def __init__(self, name):
+        self.key = (_file, name)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        entry = _stages.get(self.key)
+        if entry is None:
+            entry = _stages[self.key] = [0.0, 0]
+        entry[0] += time.perf_counter() - self.start
+        entry[1] += 1
+
+_disabled = contextlib.nullcontext()
+
+def stage(name):
+    'return a context manager timing a stage of the current file'
+    if not enabled:
+        return _disabled
+    return _Timer(name)
+
+def count(name, n=1):
+    'add n to a counter of the current file'
+    if enabled:
+        key = (_file, name)
+        _counters[key] = _counters.get(key, 0) + n
+
+@contextlib.contextmanager
+def for_file(filename):
+    'account the stages and counters inside to filename'
+    global _file
+    outer = _file
+    _file = filename
+    try:
+        yield
+    finally:
+        _file = outer
+
+
+def snapshot():
+    """Return the recorded figures as a dict for json:
+       {file: {'stages': {name: [seconds, calls]}, 'counters': {...}}}"""
+    files = {}
+    for (f, name), (seconds, calls) in _stages.items():
+        files.setdefault(f, {'stages': {}, 'counters': {}})
+        files[f]['stages'][name] = [seconds, calls]
+    for (f, name), value in _counters.items():
+        files.setdefault(f, {'stages': {}, 'counters': {}})
+        files[f]['counters'][name] = value
+    return files
+
+def take():
+    'return snapshot() and reset, e.g. to send it from a worker process'
+    files = snapshot()
+    reset()
+    return files
+
+def merge(files):
+    'add a snapshot, e.g. of a worker process, to the figures here'
+    for f, figures in files.items():
+        for name, (seconds, calls) in figures['stages'].items():
+            entry = _stages.setdefault((f, name), [0.0, 0])
+            entry[0] += seconds
+            entry[1] += calls
+        for name, value in figures['counters'].items():
+            _counters[(f, name)] = _counters.get((f, name), 0) + value
+
+
+def _derive(figures):
+    'add throughput and cache hit rates to the figures of one file'
+    stages, counters = figures['stages'], figures['counters']
+    rates = {}
+    for rate, counter, stage in RATES:
+        if counter in counters and stages.get(stage, [0])[0] > 0:
+            rates[rate] = counters[counter] / stages[stage][0]
+    for name in counters:
+        if name.endswith(' hits'):
+            what = name[:-len(' hits')]
+            lookups = counters[name] + counters.get(what + ' misses', 0)
+            rates[what + ' hit rate'] = counters[name] / lookups
+    figures['rates'] = rates
+    return figures
+
+def report():
+    'return snapshot() with a TOTAL entry and rates added'
+    files = snapshot()
+    total = {'stages': {}, 'counters': {}}
+    for figures in files.values():
+        for name, (seconds, calls) in figures['stages'].items():
+            entry = total['stages'].setdefault(name, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += calls
+        for name, value in figures['counters'].items():
+            total['counters'][name] = total['counters'].get(name, 0) + value
+    files[TOTAL] = total
+    for figures in files.values():
+        _derive(figures)
+    return files
+
+def text_table(files):
+    'return report() as lines of text, totals first'
+    lines = []
+    for f in [TOTAL] + sorted(f for f in files if f != TOTAL):
+        figures = files[f]
+        lines.append(f)
+        for name, (seconds, calls) in sorted(figures['stages'].items(),
+                                             key=lambda s: -s[1][0]):
+            lines.append('  %10.4fs %8d x  %s' % (seconds, calls, name))
+        for name, value in sorted(figures['counters'].items()):
+            lines.append('  %12d    %s' % (value, name))
+        for name, value in sorted(figures['rates'].items()):
+            if name.endswith('hit rate'):
+                lines.append('  %11.1f%%    %s' % (value * 100, name))
+            else:
+                lines.append('  %12.0f    %s' % (value, name))
+    return lines
+
+def dump(filename='-'):
+    """Write report() to filename, as JSON if it ends in .json, else as
+       a text table; '-' is stderr, as stdout may carry an export."""
+    files = report()
+    if filename.endswith('.json'):
+        data = json.dumps(files, indent=2, sort_keys=True) + '\n'
+    else:
+        data = ''.join(line + '\n' for line in text_table(files))
+    if filename == '-':
+        sys.stderr.write(data)
+    else:
+        with open(filename, 'w') as f:
+            f.write(data)
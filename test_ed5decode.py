@@ -0,0 +1,92 @@
+#!/usr/bin/python3
+
+"""
+test_ed5decode.py -- Tests of the edit record decoder.
+
+Copyright (C) 2015 William R. Zwicky <wrzwicky@pobox.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Run with:  python3 -m unittest test_ed5decode
+"""
+
+import logging, os, random, tempfile, unittest
+import ed5decode
+import lwsynth
+
+
+def fields(cell):
+    return {name: getattr(cell, name) for name in ed5decode.EditCell.__slots__}
+
+
+class EditRecordTest(unittest.TestCase):
+    """decode_edit_records + cells_from_columns must give the same cells
+       as Subsegment.edit_cell, the record by record reference."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = tmp.name
+        # the shot files, so that reels resolve to their cookies
+        lwsynth.write_project(self.directory, shots=20, cuts=5)
+        edit = [name for name in os.listdir(self.directory)
+                if name.startswith('E')][0]
+        ed5 = ed5decode.ED5(os.path.join(self.directory, edit), debug=False)
+        self.subsegment = [s for seg in ed5.childs for s in seg.childs
+                           if s.label == b'C'][0]
+
+        records = lwsynth.track_records(random.Random(2), 200, 20, True, 20)
+        # a time selector the decoders don't know
+        records.append((5.0, 6.0, lwsynth.FIRST_REEL, b'A', 2, 7, 8))
+        self.data = b''.join(ed5decode.EDIT_RECORD.pack(0.5, 1.0, *r)
+                             for r in records)
+
+    def reference(self, data):
+        size = ed5decode.EDIT_RECORD.size
+        return [self.subsegment.edit_cell(data[n:n+size], b'V1',
+                                          self.directory)
+                for n in range(0, len(data) - size + 1, size)]
+
+    def columnar(self, data):
+        return ed5decode.cells_from_columns(
+            ed5decode.decode_edit_records(data), 'V1', self.directory)
+
+    def test_same_cells(self):
+        with self.assertLogs(level=logging.ERROR):
+            expected = self.reference(self.data)
+            cells = self.columnar(self.data)
+        self.assertEqual(len(cells), len(self.data) // 64)
+        self.assertEqual([fields(c) for c in cells],
+                         [fields(c) for c in expected])
+        self.assertIn('BL', [c.reel for c in cells])
+        self.assertIn('dissolve', [c.reel for c in cells])
+        self.assertNotIn(None, [c.reel for c in cells])
+
+    def test_incomplete_record(self):
+        data = self.data + self.data[:20]
+        with self.assertLogs(level=logging.ERROR) as logs:
+            cells = self.columnar(data)
+            expected = self.reference(data)
+        self.assertIn('ignoring 20 bytes of incomplete edit record',
+                      '\n'.join(logs.output))
+        self.assertEqual([fields(c) for c in cells],
+                         [fields(c) for c in expected])
+
+    def test_no_records(self):
+        self.assertEqual(self.columnar(b''), [])
+        with self.assertLogs(level=logging.ERROR):
+            self.assertEqual(self.columnar(self.data[:63]), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+#!/usr/bin/python3
+
+"""
+timecode.py -- Convert between seconds, frame counts and SMPTE timecode.
+
+Copyright (C) 2015 William R. Zwicky <wrzwicky@pobox.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import functools
+
+# every separator of hours, minutes, seconds and frames turned to ':'
+SEPARATORS = str.maketrans(';.+', ':::')
+
+
+def is_dropframe(fps):
+    'True for the NTSC rates (29.97, 59.94) that use drop-frame timecode'
+    base = round(fps)
+    return base % 30 == 0 and base > 0 and abs(fps - base) > 0.001
+
+
+@functools.lru_cache(maxsize=None)
+def formatter(fps, drop=None):
+    'return the shared Formatter for fps'
+    return Formatter(fps, drop)
+
+
+class Formatter:
+    """Timecode of one frame rate.
+
+       Times are counted in whole frames; seconds are rounded to the
+       nearest frame once, so a frame field can never reach fps.  Strings
+       are put together from two prebuilt tables, 'HH:MM:' for every
+       minute of the day and 'SS:FF' for every frame of a minute.  Hours
+       wrap after 24, like time.gmtime() does.
+
+       Drop-frame timecode (29.97, 59.94) is written as HH:MM:SS;FF and
+       skips labels 0 and 1 (0-3 at 59.94) at the start of every minute
+       except each tenth."""
+
+    def __init__(self, fps, drop=None):
+        if fps <= 0:
+            raise ValueError('frame rate must be positive: %r' % fps)
+        self.base = round(fps)
+        """nominal frames per second, the range of the frame field"""
+        self.drop = is_dropframe(fps) if drop is None else drop
+        self.rate = self.base * 1000 / 1001 if self.drop else fps
+        """real frames per second"""
+        self.sep = ';' if self.drop else ':'
+
+        self.dropped = self.base // 15 if self.drop else 0
+        """labels skipped per minute"""
+        self.per_minute = self.base * 60 - self.dropped
+        self.per_10min = self.per_minute * 10 + self.dropped
+
+        self._minute = self.base * 60
+        self._hm = ['%02d:%02d:' % divmod(m, 60) for m in range(24 * 60)]
+        self._sf = ['%02d%s%02d' % (s, self.sep, f)
+                    for s in range(60) for f in range(self.base)]
+
+    def frames(self, seconds):
+        'return seconds as a whole number of frames'
+        if self.rate != self.base:
+            return round(seconds * self.rate)
+        # the fraction on its own is more exact, and rounds like the old
+        # ed5decode.t2hmsf did
+        sec, frac = divmod(seconds, 1)
+        return int(sec) * self.base + round(frac * self.base)
+
+    def label(self, n):
+        'return the frame count of the timecode label of frame n'
+        if not self.drop:
+            return n
+        tens, rest = divmod(n, self.per_10min)
+        n += 9 * self.dropped * tens
+        if rest > self.dropped:
+            n += self.dropped * ((rest - self.dropped) // self.per_minute)
+        return n
+
+    def __call__(self, n):
+        'return timecode string of frame n'
+        n = self.label(n)
+        return self._hm[n // self._minute % 1440] + self._sf[n % self._minute]
+
+    def seconds(self, t):
+        'return timecode string of t seconds'
+        return self(self.frames(t))
+
+    def format_frames(self, frames):
+        'return list of timecode strings for a sequence of frame numbers'
+        hm, sf, minute = self._hm, self._sf, self._minute
+        if self.drop:
+            frames = map(self.label, frames)
+        return [hm[n // minute % 1440] + sf[n % minute] for n in frames]
+
+    def format_seconds(self, times):
+        """Return list of timecode strings for a sequence of seconds,
+           e.g. an array column of decoded edit records."""
+        if self.rate != self.base:
+            rate = self.rate
+            return self.format_frames([round(t * rate) for t in times])
+        base = self.base
+        return self.format_frames([int(t // 1) * base + round(t % 1 * base)
+                                   for t in times])
+
+    def parse(self, s):
+        """Return frame number of a timecode string.  The frames may be
+           separated by ':', ';', '.' or '+' (as in odb files)."""
+        h, m, sec, f = map(int, s.translate(SEPARATORS).split(':'))
+        n = ((h * 60 + m) * 60 + sec) * self.base + f
+        if self.drop:
+            minutes = h * 60 + m
+            n -= self.dropped * (minutes - minutes // 10)
+        return n
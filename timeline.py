@@ -0,0 +1,198 @@
+#!/usr/bin/python3
+
+"""
+timeline.py -- Edit cells of a sequence as whole frames.
+
+Copyright (C) 2015 William R. Zwicky <wrzwicky@pobox.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import array, bisect, itertools, logging
+import profiling
+import timecode
+
+TRANSITIONS = {
+    'dissolve': 'D',
+}
+"""EDL transition code of each transition reel.  Lightworks marks a
+   dissolve with reel 0xb655; wipes ('W' and the SMPTE wipe number) and
+   keys ('K') go here once their reel numbers are known."""
+
+
+def frame_counter(fps):
+    'return a function converting seconds to whole frames at fps'
+    if fps > 0:
+        return timecode.formatter(fps).frames
+    # no frame rate known, everything is at frame 0
+    return lambda t: 0
+
+
+def resolve_transitions(cells):
+    """Pair each transition cell with the clip after it, in one pass.
+
+       Returns a list of (clip, transition) positions in cells, leaving
+       out the transition cells; transition is None for a cut.  In an
+       EDL the pair becomes one event: the transition's rec_in and
+       duration (its src_out) on the line of the incoming clip."""
+    pairs = []
+    pending = None
+    for i, c in enumerate(cells):
+        if c.reel in TRANSITIONS:
+            if pending is not None:
+                logging.error('%s without clip, ignored' % cells[pending].reel)
+            pending = i
+        else:
+            pairs.append((i, pending))
+            pending = None
+    if pending is not None:
+        logging.error('%s at end of edit, ignored' % cells[pending].reel)
+    return pairs
+
+
+class Timeline:
+    """Merged edit cells of one sequence, converted to frames once.
+
+       Clip i is cells[i]; its times are in the arrays rec_in, rec_out,
+       src_in and src_out.  All exporters take their frame numbers from
+       here, so they round each time the same way.
+
+       Usage:
+           tl = Timeline(cells, fps)
+           for i in tl.tracks['V1']:
+               print(tl.cells[i].reel, tl.rec_in[i], tl.rec_out[i])"""
+
+    def __init__(self, cells, fps):
+        self.fps = fps
+        self.cells = list(cells)
+        """the EditCell of each clip"""
+
+        frames = frame_counter(fps)
+        cells = self.cells
+        with profiling.stage('timeline'):
+            self.rec_in = array.array('q', [frames(c.rec_in) for c in cells])
+            self.rec_out = array.array('q', [frames(c.rec_out)
+                                             for c in cells])
+            self.src_in = array.array('q', [frames(c.src_in) for c in cells])
+            self.src_out = array.array('q', [frames(c.src_out)
+                                             for c in cells])
+
+        self.track_names = [c.track.split() for c in cells]
+        """list of the track names of each clip"""
+        self.tracks = {}
+        """map from track name to clip numbers, sorted by rec_in"""
+        for i, names in enumerate(self.track_names):
+            for name in names:
+                self.tracks.setdefault(name, []).append(i)
+        for clips in self.tracks.values():
+            clips.sort(key=self.rec_in.__getitem__)
+        self._indexes = {}
+
+    def index(self, track):
+        'return the TrackIndex of a track'
+        if track not in self._indexes:
+            self._indexes[track] = TrackIndex(self, self.tracks.get(track, []))
+        return self._indexes[track]
+
+    def at(self, track, frame):
+        'return the clips on track at frame'
+        return self.index(track).at(frame)
+
+    def __len__(self):
+        return len(self.cells)
+
+    def playlists(self, kind='V'):
+        """Return map from channel to TrackIndex of its clips.
+           Each clip goes to the first of its tracks starting with kind,
+           i.e. 'V' gives one playlist per video channel."""
+        lists = {}
+        for i, names in enumerate(self.track_names):
+            for name in names:
+                if name.startswith(kind) and name[1:2].isdigit():
+                    lists.setdefault(name, []).append(i)
+                    break
+        for name, clips in lists.items():
+            clips.sort(key=self.rec_in.__getitem__)
+            lists[name] = TrackIndex(self, clips)
+        return lists
+
+
+class TrackIndex:
+    """Clips of one track sorted by start frame, for bisect lookups.
+
+       reach[k] is the latest end of clips[0..k], so a lookup walks back
+       from the bisect position only as long as an earlier clip can still
+       cover the frame.  On a track without overlaps that is one step,
+       making point and range queries O(log n)."""
+
+    def __init__(self, timeline, clips):
+        self.timeline = timeline
+        self.clips = clips
+        """clip numbers, sorted by rec_in"""
+        self.starts = array.array('q', [timeline.rec_in[i] for i in clips])
+        self.ends = array.array('q', [timeline.rec_out[i] for i in clips])
+        self.reach = array.array('q', itertools.accumulate(self.ends, max))
+
+    def __len__(self):
+        return len(self.clips)
+
+    def __iter__(self):
+        return iter(self.clips)
+
+    def _covering(self, k, frame):
+        # clips before position k ending after frame
+        found = []
+        while k > 0 and self.reach[k-1] > frame:
+            k -= 1
+            if self.ends[k] > frame:
+                found.append(self.clips[k])
+        found.reverse()
+        return found
+
+    def at(self, frame):
+        'return the clips playing at frame'
+        return self._covering(bisect.bisect_right(self.starts, frame), frame)
+
+    def between(self, start, end):
+        'return the clips overlapping frames start to end (exclusive)'
+        return self._covering(bisect.bisect_left(self.starts, end), start)
+
+    def overlaps(self):
+        'return list of (earlier, later) clip pairs that overlap'
+        pairs = []
+        for k in range(1, len(self.clips)):
+            start = self.starts[k]
+            if self.reach[k-1] > start:
+                pairs.extend((c, self.clips[k])
+                             for c in self._covering(k, start))
+        return pairs
+
+    def gaps(self, start=0, end=None):
+        'return list of (start, end) ranges not covered by any clip'
+        gaps = []
+        cursor = start
+        for s, e in zip(self.starts, self.ends):
+            if s > cursor:
+                gaps.append((cursor, s))
+            cursor = max(cursor, e)
+        if end is not None and end > cursor:
+            gaps.append((cursor, end))
+        return gaps
+
+    def playlist(self):
+        'yield (clip, blank) with the frames of gap before each clip'
+        cursor = 0
+        for clip, s, e in zip(self.clips, self.starts, self.ends):
+            yield clip, max(0, s - cursor)
+            cursor = max(cursor, e)
@@ -0,0 +1,96 @@
+#!/usr/bin/python3
+
+"""
+xmlwriter.py -- Write indented XML straight to a file.
+
+Copyright (C) 2015 William R. Zwicky <wrzwicky@pobox.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import contextlib
+from xml.sax.saxutils import escape
+
+
+class XMLWriter:
+    """Streams XML elements to a file handle as they are produced.
+
+       Only the names of the open elements are kept, so memory does not
+       grow with the document.  The layout matches minidom's toprettyxml:
+       an element holding only text stays on one line, others get their
+       children indented below.  Elements are never condensed to <tag/>
+       (Premiere rejects that) unless written with stag().
+
+       Usage is similar to yattag:
+           w = XMLWriter(f)
+           with w.tag('clip', id='x'):
+               with w.tag('name'):
+                   w.text('x')"""
+
+    def __init__(self, f, indent='  ', stack=()):
+        self.f = f
+        self.indent = indent
+        self.stack = list(stack)
+        """names of the open elements; a writer for a fragment starts
+           with the elements opened around it by another writer"""
+        self.started = False
+        """True while the last start tag has no content yet"""
+
+    def declaration(self):
+        self.f.write('<?xml version="1.0" ?>\n')
+
+    def start(self, name, /, **attrs):
+        if self.started:
+            self.f.write('\n')
+        self.f.write('%s<%s%s>' % (self.indent * len(self.stack), name,
+                                   self._attrs(attrs)))
+        self.stack.append(name)
+        self.started = True
+
+    def end(self):
+        name = self.stack.pop()
+        if self.started:
+            # text only (or empty) element, close on the same line
+            self.f.write('</%s>\n' % name)
+        else:
+            self.f.write('%s</%s>\n' % (self.indent * len(self.stack), name))
+        self.started = False
+
+    def text(self, s):
+        self.f.write(escape(s))
+
+    def raw(self, s):
+        'write a fragment made by another XMLWriter at the current depth'
+        if self.started:
+            self.f.write('\n')
+        self.f.write(s)
+        self.started = False
+
+    def stag(self, name, /, **attrs):
+        'write an empty, self-closing element'
+        if self.started:
+            self.f.write('\n')
+        self.f.write('%s<%s%s/>\n' % (self.indent * len(self.stack), name,
+                                      self._attrs(attrs)))
+        self.started = False
+
+    @contextlib.contextmanager
+    def tag(self, name, /, **attrs):
+        self.start(name, **attrs)
+        yield
+        self.end()
+
+    def _attrs(self, attrs):
+        return ''.join(' %s="%s"' % (k, escape(str(v), {'"': '&quot;'}))
+                       for k, v in attrs.items())